@@ -1,3 +1,195 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-# Register your models here.
+from main.exceptions import VersionConflict
+from main.models import (
+    Admin,
+    AuditEntry,
+    Clinic,
+    Consultation,
+    Doctor,
+    DoctorEducation,
+    DoctorProfile,
+    IdempotencyKey,
+    Job,
+    Patient,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    # COUNT(*) по большой таблице без фильтров заменяется оценкой планировщика
+    # из pg_class.reltuples; маленькие таблицы и фильтры считаются точно
+    exact_threshold = 10_000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == "postgresql" and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.exact_threshold:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class SoftDeleteAdmin(LargeTableAdmin):
+    # в админке видны и помеченные на удаление записи
+    list_filter = ["is_deleted"]
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+class PersonAdminForm(forms.ModelForm):
+    # хэш пароля не показывается и не редактируется напрямую: новый пароль
+    # обязателен при создании, при изменении пустое поле оставляет старый
+    new_password = forms.CharField(
+        label="Новый пароль",
+        required=False,
+        strip=False,
+        widget=forms.PasswordInput(render_value=False),
+    )
+
+    def clean_new_password(self):
+        password = self.cleaned_data["new_password"]
+        if not password and self.instance._state.adding:
+            raise forms.ValidationError("Укажите пароль")
+        return password
+
+    def save(self, commit=True):
+        if self.cleaned_data.get("new_password"):
+            self.instance.password = make_password(self.cleaned_data["new_password"])
+        return super().save(commit)
+
+
+class PersonAdmin(SoftDeleteAdmin):
+    list_display = ["__str__", "email", "phone_number", "date_birth", "is_deleted"]
+    search_fields = ["^last_name", "^phone_number", "^email"]
+    ordering = ["last_name", "first_name"]
+    form = PersonAdminForm
+    exclude = ["password"]
+
+
+@admin.register(Doctor)
+class DoctorAdmin(PersonAdmin):
+    list_display = PersonAdmin.list_display[:3] + ["specialization", "is_deleted"]
+    list_filter = ["specialization", "is_deleted"]
+
+
+@admin.register(Patient)
+class PatientAdmin(PersonAdmin):
+    pass
+
+
+@admin.register(Admin)
+class AdminAdmin(PersonAdmin):
+    pass
+
+
+@admin.register(Clinic)
+class ClinicAdmin(SoftDeleteAdmin):
+    list_display = ["name", "actual_adress", "is_deleted"]
+    search_fields = ["^name"]
+    ordering = ["name"]
+    raw_id_fields = ["doctors"]
+
+
+class ConsultationAdminForm(forms.ModelForm):
+    # версия, с которой открыта форма: POST заново загружает запись, и без
+    # неё правка поверх чужого изменения выглядела бы свежей
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.instance._state.adding:
+            self.fields["loaded_version"].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        loaded_version = cleaned_data.get("loaded_version")
+        if loaded_version is not None and loaded_version != self.instance.version:
+            raise forms.ValidationError(VersionConflict.default_detail)
+        return cleaned_data
+
+
+@admin.register(Consultation)
+class ConsultationAdmin(SoftDeleteAdmin):
+    form = ConsultationAdminForm
+    list_display = ["start_time", "end_time", "status", "doctor", "patient", "clinic"]
+    list_filter = ["status", "is_deleted"]
+    list_select_related = ["doctor", "patient", "clinic"]
+    autocomplete_fields = ["doctor", "patient", "clinic"]
+    date_hierarchy = "start_time"
+    ordering = ["-start_time"]
+    readonly_fields = ["version", "created_at", "updated_at"]
+
+
+@admin.register(DoctorEducation)
+class DoctorEducationAdmin(LargeTableAdmin):
+    list_display = ["doctor", "university", "faculty", "date_start", "date_end"]
+    list_select_related = ["doctor"]
+    autocomplete_fields = ["doctor"]
+    search_fields = ["^university"]
+
+
+@admin.register(DoctorProfile)
+class DoctorProfileAdmin(LargeTableAdmin):
+    list_display = ["doctor", "is_deleted", "refreshed_at"]
+    list_select_related = ["doctor"]
+    raw_id_fields = ["doctor"]
+    readonly_fields = ["document", "refreshed_at"]
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ["task", "queue", "status", "attempts", "run_at", "finished_at"]
+    list_filter = ["status", "queue"]
+    ordering = ["-run_at"]
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(LargeTableAdmin):
+    list_display = ["created_at", "entity_type", "entity_id", "action", "actor"]
+    list_filter = ["entity_type", "action"]
+    search_fields = ["=entity_id"]
+    ordering = ["-created_at"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(LargeTableAdmin):
+    list_display = [
+        "key",
+        "user",
+        "endpoint",
+        "status_code",
+        "created_at",
+        "expires_at",
+    ]
+    list_select_related = ["user"]
+    search_fields = ["=key"]
+    ordering = ["-created_at"]
@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from main.db_router import PRIMARY
+from main.models import AuditEntry
+
+logger = logging.getLogger(__name__)
+
+IGNORED_FIELDS = {"updated_at", "version", "sync_seq"}
+MASKED_FIELDS = {"password"}
+
+_request: ContextVar[Any] = ContextVar("audit_request", default=None)
+
+
+def snapshot(instance) -> dict[str, Any]:
+    return {
+        field.attname: instance.__dict__[field.attname]
+        for field in instance._meta.concrete_fields
+        if field.attname in instance.__dict__ and field.attname not in IGNORED_FIELDS
+    }
+
+
+def loaded_snapshot(instance) -> dict[str, Any]:
+    loaded = getattr(instance, "_loaded_values", {})
+    return {
+        field: value for field, value in loaded.items() if field not in IGNORED_FIELDS
+    }
+
+
+def diff(before: dict[str, Any], after: dict[str, Any]) -> dict[str, list]:
+    changes = {}
+    for field, new in after.items():
+        old = before.get(field)
+        if old != new:
+            changes[field] = ["***", "***"] if field in MASKED_FIELDS else [old, new]
+    return changes
+
+
+def _actor() -> str:
+    request = _request.get()
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return str(user.pk)
+    return ""
+
+
+def capture(instance, action: str, changes: dict[str, list]) -> None:
+    entry = AuditEntry(
+        entity_type=instance._meta.model_name,
+        entity_id=instance.pk,
+        action=action,
+        changes=json.loads(json.dumps(changes, cls=DjangoJSONEncoder)),
+        actor=_actor(),
+        created_at=timezone.now(),
+    )
+    if not connection.in_atomic_block:
+        _deliver([entry])
+        return
+    _pending_for_transaction().append(entry)
+
+
+class _Pending(list):
+    def flush(self) -> None:
+        _deliver(list(self))
+        self.clear()
+
+
+def _pending_for_transaction() -> _Pending:
+    # Один список на точку сохранения: при откате savepoint Django выбрасывает
+    # только зарегистрированные внутри него on_commit, и вместе со своим
+    # списком пропадают ровно записи откаченных изменений
+    scope = tuple(connection.savepoint_ids)
+    pending_by_scope = {
+        key: pending
+        for key, pending in getattr(connection, "_audit_pending", {}).items()
+        if any(func == pending.flush for _, func, _ in connection.run_on_commit)
+    }
+    pending = pending_by_scope.get(scope)
+    if pending is None:
+        pending = pending_by_scope[scope] = _Pending()
+        transaction.on_commit(pending.flush)
+    connection._audit_pending = pending_by_scope
+    return pending
+
+
+def _deliver(entries: list[AuditEntry]) -> None:
+    if settings.AUDIT_DURABILITY == "commit":
+        write(entries)
+    else:
+        buffer.extend(entries)
+
+
+def write(entries: list[AuditEntry]) -> None:
+    if not entries:
+        return
+    db = connections[PRIMARY]
+    if db.vendor == "postgresql" and len(entries) >= settings.AUDIT_COPY_THRESHOLD:
+        _copy(db, entries)
+    elif len(entries) == 1:
+        # bulk_create оборачивает даже одну строку в транзакцию (BEGIN/COMMIT)
+        entries[0].save(using=PRIMARY, force_insert=True)
+    else:
+        AuditEntry.objects.using(PRIMARY).bulk_create(
+            entries, batch_size=settings.AUDIT_BATCH_SIZE
+        )
+
+
+def _copy(db, entries: list[AuditEntry]) -> None:
+    columns = [
+        "id",
+        "entity_type",
+        "entity_id",
+        "action",
+        "changes",
+        "actor",
+        "created_at",
+    ]
+    with db.cursor() as cursor:
+        with cursor.cursor.copy(
+            f"COPY {AuditEntry._meta.db_table} ({', '.join(columns)}) FROM STDIN"
+        ) as copy:
+            for entry in entries:
+                copy.write_row(
+                    [
+                        entry.id,
+                        entry.entity_type,
+                        entry.entity_id,
+                        entry.action,
+                        json.dumps(entry.changes, cls=DjangoJSONEncoder),
+                        entry.actor,
+                        entry.created_at,
+                    ]
+                )
+
+
+class AuditBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: list[AuditEntry] = []
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def extend(self, entries: list[AuditEntry]) -> None:
+        with self._lock:
+            self._entries.extend(entries)
+            full = len(self._entries) >= settings.AUDIT_BATCH_SIZE
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-flush", daemon=True
+                )
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+        try:
+            write(entries)
+        except DatabaseError:
+            logger.exception("Не удалось записать %s записей аудита", len(entries))
+            with self._lock:
+                self._entries[:0] = entries
+            return 0
+        return len(entries)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+            connections.close_all()
+
+
+buffer = AuditBuffer()
+atexit.register(buffer.flush)
+
+
+def history(
+    entity_type: str,
+    entity_id=None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> QuerySet[AuditEntry]:
+    queryset = AuditEntry.objects.filter(entity_type=entity_type)
+    if entity_id is not None:
+        queryset = queryset.filter(entity_id=entity_id)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset.order_by("-created_at")
+
+
+class AuditContextMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
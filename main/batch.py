@@ -0,0 +1,214 @@
+import re
+from collections import defaultdict
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from main.models import Admin, Clinic, Consultation, Doctor, Patient
+from main.serializers.clinic_serializer import ClinicSerializer
+from main.serializers.consult_serializer import (
+    ConsultationSyncSerializer,
+    ConsultationWriteSerializer,
+)
+from main.serializers.doctor_serializer import DoctorSerializer
+from main.serializers.patient_serializer import PatientSerializer
+
+# ресурс -> (модель, сериализатор записи, сериализатор ответа)
+RESOURCES = {
+    "patients": (Patient, PatientSerializer, PatientSerializer),
+    "doctors": (Doctor, DoctorSerializer, DoctorSerializer),
+    "clinics": (Clinic, ClinicSerializer, ClinicSerializer),
+    "consultations": (
+        Consultation,
+        ConsultationWriteSerializer,
+        ConsultationSyncSerializer,
+    ),
+}
+PERSON_MODELS = (Patient, Doctor, Admin)
+UNIQUE_PERSON_FIELDS = ("email", "phone_number")
+REFERENCE = re.compile(r"^\$([\w-]+)(?:\.(\w+))?$")
+
+
+class UnresolvedReference(Exception):
+    pass
+
+
+def resolve_references(value, outputs: dict[str, dict]):
+    # "$p1" -> id результата операции p1, "$p1.email" -> его поле email
+    if isinstance(value, str):
+        match = REFERENCE.match(value)
+        if not match:
+            return value
+        operation_id, field = match.groups()
+        if operation_id not in outputs:
+            raise UnresolvedReference(value)
+        return outputs[operation_id][field or "id"]
+    if isinstance(value, dict):
+        return {key: resolve_references(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, outputs) for item in value]
+    return value
+
+
+def _literal(value) -> bool:
+    return isinstance(value, str) and not REFERENCE.match(value)
+
+
+def build_context(operations: list[dict]) -> dict[str, Any]:
+    # Общие запросы проверки для однотипных операций: связанные объекты
+    # и занятые email/телефоны загружаются по одному запросу на таблицу
+    context: dict[str, Any] = {"prefetched": {}, "taken": None, "instances": {}}
+
+    updates = defaultdict(set)
+    for operation in operations:
+        if operation["method"] == "update":
+            updates[operation["resource"]].add(operation["pk"])
+    for resource, pks in updates.items():
+        model = RESOURCES[resource][0]
+        context["instances"][model] = model.objects.in_bulk(pks)
+
+    # ссылки "$op" на созданные в пакете записи тоже берутся из этого кэша,
+    # поэтому словари заводятся для всех связей, даже без явных pk
+    related: dict[str, set] = {}
+    for operation in operations:
+        if operation["resource"] == "consultations":
+            for field in ("doctor", "patient", "clinic"):
+                pks = related.setdefault(field, set())
+                value = operation["data"].get(field)
+                if _literal(value):
+                    pks.add(value)
+    fields = ConsultationWriteSerializer().fields
+    for field, pks in related.items():
+        queryset = fields[field].get_queryset()
+        try:
+            context["prefetched"][queryset.model] = queryset.in_bulk(pks)
+        except ValidationError:
+            # некорректные pk отсеет сам сериализатор
+            context["prefetched"][queryset.model] = {}
+
+    values = defaultdict(set)
+    for operation in operations:
+        if RESOURCES[operation["resource"]][0] in PERSON_MODELS:
+            for field in UNIQUE_PERSON_FIELDS:
+                value = operation["data"].get(field)
+                if _literal(value):
+                    values[field].add(value.replace(" ", ""))
+    if values:
+        taken = {field: defaultdict(set) for field in UNIQUE_PERSON_FIELDS}
+        condition = Q(email__in=values["email"]) | Q(
+            phone_number__in=values["phone_number"]
+        )
+        for model in PERSON_MODELS:
+            rows = model.all_objects.filter(condition).values_list(
+                "id", "email", "phone_number"
+            )
+            for pk, email, phone_number in rows:
+                taken["email"][email].add(pk)
+                taken["phone_number"][phone_number].add(pk)
+        context["taken"] = taken
+    return context
+
+
+def _remember(instance, context: dict[str, Any]) -> None:
+    model = type(instance)
+    if model in context["prefetched"] and not getattr(instance, "is_deleted", False):
+        context["prefetched"][model][instance.pk] = instance
+    if context["taken"] is not None and model in PERSON_MODELS:
+        for field in UNIQUE_PERSON_FIELDS:
+            for ids in context["taken"][field].values():
+                ids.discard(instance.pk)
+            context["taken"][field][getattr(instance, field)].add(instance.pk)
+
+
+def _run(operation: dict, data: dict, context: dict[str, Any]) -> tuple[int, dict]:
+    model, serializer_class, output_class = RESOURCES[operation["resource"]]
+    instance = None
+    if operation["method"] == "update":
+        instance = context["instances"][model].get(operation["pk"])
+        if instance is None:
+            return status.HTTP_404_NOT_FOUND, {"detail": "Запись не найдена"}
+    serializer = serializer_class(
+        instance,
+        data=data,
+        partial=instance is not None,
+        context={
+            "prefetched": context["prefetched"],
+            "taken": context["taken"] or {},
+        },
+    )
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+    instance = serializer.save()
+    _remember(instance, context)
+    return (
+        (
+            status.HTTP_200_OK
+            if operation["method"] == "update"
+            else status.HTTP_201_CREATED
+        ),
+        output_class(instance).data,
+    )
+
+
+def _validation_errors(error: ValidationError) -> dict:
+    if hasattr(error, "error_dict"):
+        return error.message_dict
+    return {"non_field_errors": error.messages}
+
+
+def execute(operations: list[dict], atomic: bool = True) -> list[dict]:
+    results = []
+    outputs: dict[str, dict] = {}
+    with transaction.atomic():
+        context = build_context(operations)
+        failed = False
+        for operation in operations:
+            result = {"id": operation.get("id")}
+            results.append(result)
+            if failed and atomic:
+                result.update(status=status.HTTP_424_FAILED_DEPENDENCY, errors=None)
+                continue
+            try:
+                data = resolve_references(operation["data"], outputs)
+            except UnresolvedReference as error:
+                result.update(
+                    status=status.HTTP_424_FAILED_DEPENDENCY,
+                    errors={"detail": f"Ссылка {error} не разрешена"},
+                )
+                failed = True
+                continue
+            try:
+                if atomic:
+                    code, body = _run(operation, data, context)
+                else:
+                    with transaction.atomic():
+                        code, body = _run(operation, data, context)
+                        if code >= 400:
+                            transaction.set_rollback(True)
+            except APIException as error:
+                code, body = error.status_code, {"detail": error.detail}
+            except ValidationError as error:
+                # Model.full_clean() в save(): проверки модели, которых нет
+                # в сериализаторе
+                code, body = status.HTTP_400_BAD_REQUEST, _validation_errors(error)
+            except IntegrityError:
+                # гонка с параллельной записью за проверками сериализатора;
+                # в режиме atomic=false откатывается только savepoint операции
+                code, body = status.HTTP_400_BAD_REQUEST, {
+                    "detail": "Запись нарушает ограничение целостности"
+                }
+            result["status"] = code
+            if code >= 400:
+                result["errors"] = body
+                failed = True
+                continue
+            result["data"] = body
+            if operation.get("id"):
+                outputs[operation["id"]] = body
+        if atomic and failed:
+            transaction.set_rollback(True)
+    return results
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import Any
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    def __init__(self, broadcaster: "Broadcaster", channels: list[str]):
+        self.broadcaster = broadcaster
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+
+    async def __aenter__(self):
+        await self.broadcaster.backend.start()
+        self.broadcaster.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broadcaster.remove(self)
+
+    def deliver(self, event: dict[str, Any]) -> None:
+        # вызывается из любого потока; медленный клиент теряет события,
+        # а не копит их в памяти
+        def put():
+            if not self.queue.full():
+                self.queue.put_nowait(event)
+
+        self.loop.call_soon_threadsafe(put)
+
+    async def get(self) -> dict[str, Any]:
+        return await self.queue.get()
+
+
+class Broadcaster:
+    def __init__(self, backend_path: str):
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self.backend = import_string(backend_path)(self)
+
+    def subscribe(self, channels: list[str]) -> Subscription:
+        return Subscription(self, channels)
+
+    def add(self, subscription: Subscription) -> None:
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+
+    def remove(self, subscription: Subscription) -> None:
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def publish(self, channels: list[str], event: dict[str, Any]) -> None:
+        self.backend.publish(channels, event)
+
+    def dispatch(self, channels: list[str], event: dict[str, Any]) -> None:
+        with self._lock:
+            targets = set().union(
+                *(self._subscribers.get(channel, ()) for channel in channels)
+            )
+        for subscription in targets:
+            subscription.deliver(event)
+
+
+class LocalBackend:
+    # события видны только подписчикам этого же процесса
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+
+    async def start(self) -> None:
+        pass
+
+    def publish(self, channels: list[str], event: dict[str, Any]) -> None:
+        self.broadcaster.dispatch(channels, event)
+
+
+class PostgresNotifyBackend:
+    # NOTIFY доставляет события во все процессы, слушающие канал
+    CHANNEL = "schedule_events"
+
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+        self._listener: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    def publish(self, channels: list[str], event: dict[str, Any]) -> None:
+        payload = json.dumps(
+            {"channels": channels, "event": event}, cls=DjangoJSONEncoder
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.CHANNEL, payload])
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        params = connection.get_connection_params()
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **params, autocommit=True
+                ) as listener:
+                    await listener.execute(f"LISTEN {self.CHANNEL}")
+                    async for notify in listener.notifies():
+                        message = json.loads(notify.payload)
+                        self.broadcaster.dispatch(message["channels"], message["event"])
+            except psycopg.OperationalError:
+                await asyncio.sleep(1)
+
+
+broadcaster = Broadcaster(settings.SCHEDULE_BROADCAST_BACKEND)
+
+
+def consultation_channels(consultation) -> list[str]:
+    return [
+        f"doctor:{consultation.doctor_id}",
+        f"clinic:{consultation.clinic_id}",
+        f"day:{timezone.localdate(consultation.start_time).isoformat()}",
+    ]
+
+
+def publish_consultation_event(consultation, event_type: str) -> None:
+    broadcaster.publish(
+        consultation_channels(consultation),
+        json.loads(
+            json.dumps(
+                {
+                    "type": event_type,
+                    "id": consultation.id,
+                    "doctor": consultation.doctor_id,
+                    "patient": consultation.patient_id,
+                    "clinic": consultation.clinic_id,
+                    "start_time": consultation.start_time,
+                    "end_time": consultation.end_time,
+                    "status": consultation.status,
+                    "version": consultation.version,
+                    "is_deleted": consultation.is_deleted,
+                },
+                cls=DjangoJSONEncoder,
+            )
+        ),
+    )
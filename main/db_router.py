@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = "default"
+PIN_COOKIE = "db_primary_pin"
+
+_pinned: ContextVar[bool] = ContextVar("db_primary_pinned", default=False)
+# реплика, выбранная для текущего запроса (контекста): все его чтения, включая
+# prefetch_related и связанные объекты, видят одно и то же отставание
+_replica: ContextVar[str | None] = ContextVar("db_replica", default=None)
+_lag_lock = threading.Lock()
+_lag_cache: dict[str, tuple[float, float | None]] = {}
+
+
+def replica_aliases() -> list[str]:
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def pin_to_primary() -> None:
+    _pinned.set(True)
+
+
+@contextmanager
+def use_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _measure_lag(alias: str) -> float | None:
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+            "END"
+        )
+        (lag,) = cursor.fetchone()
+    return float(lag) if lag is not None else None
+
+
+def replica_lag(alias: str) -> float | None:
+    now = time.monotonic()
+    with _lag_lock:
+        if alias in _lag_cache:
+            checked_at, lag = _lag_cache[alias]
+            if now - checked_at < settings.DB_REPLICA_LAG_CHECK_INTERVAL:
+                return lag
+        else:
+            lag = None
+        # отмечаем заранее, чтобы параллельные потоки не проверяли реплику разом
+        _lag_cache[alias] = (now, lag)
+    try:
+        lag = _measure_lag(alias)
+    except DatabaseError:
+        lag = None
+    with _lag_lock:
+        _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas() -> list[str]:
+    healthy = []
+    for alias in replica_aliases():
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.DB_REPLICA_MAX_LAG:
+            healthy.append(alias)
+    return healthy
+
+
+def _read_alias() -> str:
+    replicas = healthy_replicas()
+    alias = _replica.get()
+    if alias is None:
+        alias = random.choice(replicas) if replicas else PRIMARY
+    elif alias not in replicas:
+        # отставшая реплика заменяется только на primary: другая реплика
+        # могла бы оказаться позади уже прочитанного
+        alias = PRIMARY
+    _replica.set(alias)
+    return alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get():
+            return PRIMARY
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db is not None:
+            # связанные объекты читаются из той же базы, что и сам объект
+            return instance._state.db
+        return _read_alias()
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class PrimaryPinningMiddleware:
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(
+            request.method not in self.SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        )
+        replica_token = _replica.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(replica_token)
+            _pinned.reset(token)
+        if request.method not in self.SAFE_METHODS:
+            # следующие чтения клиента идут в primary, пока реплики догоняют
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
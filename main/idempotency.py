@@ -0,0 +1,78 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from main.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def _fingerprint(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{body}".encode()).hexdigest()
+
+
+def _replay(record: IdempotencyKey, fingerprint: str) -> Response:
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"detail": "Ключ идемпотентности уже использован с другим запросом"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"detail": "Запрос с этим ключом ещё выполняется"},
+            status=status.HTTP_409_CONFLICT,
+        )
+    response = Response(record.response, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    # Ключ вставляется в той же транзакции, что и сама запись: параллельный
+    # повтор ждёт на уникальном индексе и после коммита получает готовый ответ
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method != "POST":
+            return view(request, *args, **kwargs)
+        # ключ принадлежит пользователю: иначе чужой запрос с тем же ключом
+        # получил бы 422 или сохранённый ответ с данными пациента
+        user = request.user if request.user.is_authenticated else None
+        scope = {"user": user, "endpoint": request.path, "key": key}
+        fingerprint = _fingerprint(request)
+        now = timezone.now()
+        record = IdempotencyKey.objects.filter(**scope, expires_at__gt=now).first()
+        if record is not None:
+            return _replay(record, fingerprint)
+        IdempotencyKey.objects.filter(**scope, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    **scope,
+                    fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    return response
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=["status_code", "response"])
+                return response
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(**scope).first()
+            if record is None:
+                raise
+            return _replay(record, fingerprint)
+
+    return wrapper
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+_current: ContextVar["RequestMetrics | None"] = ContextVar(
+    "request_metrics", default=None
+)
+# False внутри not_recorded(): служебные запросы не попадают в registry
+_recording: ContextVar[bool] = ContextVar("record_metrics", default=True)
+
+
+@dataclass
+class RequestMetrics:
+    view: str = "unresolved"
+    query_count: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+    total_time: float = 0.0
+    response_size: int = 0
+    signatures: Counter = field(default_factory=Counter)
+
+    @property
+    def duplicate_queries(self) -> int:
+        return sum(count - 1 for count in self.signatures.values() if count > 1)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            self.signatures[sql] += 1
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            [
+                f'db;dur={self.db_time * 1000:.2f};desc="{self.query_count} queries"',
+                f"ser;dur={self.serializer_time * 1000:.2f}",
+                f"total;dur={self.total_time * 1000:.2f}",
+            ]
+        )
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(Counter)
+
+    def record(self, metrics: RequestMetrics) -> None:
+        with self._lock:
+            stats = self._views[metrics.view]
+            stats["requests"] += 1
+            stats["queries"] += metrics.query_count
+            stats["duplicate_queries"] += metrics.duplicate_queries
+            stats["db_seconds"] += metrics.db_time
+            stats["serializer_seconds"] += metrics.serializer_time
+            stats["total_seconds"] += metrics.total_time
+            stats["response_bytes"] += metrics.response_size
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            snapshot = {view: dict(stats) for view, stats in self._views.items()}
+        lines = []
+        for name in (
+            "requests",
+            "queries",
+            "duplicate_queries",
+            "db_seconds",
+            "serializer_seconds",
+            "total_seconds",
+            "response_bytes",
+        ):
+            metric = f"mis_view_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for view, stats in sorted(snapshot.items()):
+                lines.append(f'{metric}{{view="{view}"}} {stats.get(name, 0)}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def current_metrics() -> RequestMetrics | None:
+    return _current.get()
+
+
+@contextmanager
+def not_recorded():
+    # запросы прогрева воркера идут через тестовый клиент в том же потоке;
+    # флаг в контексте, а не заголовок, который мог бы прислать любой клиент
+    token = _recording.set(False)
+    try:
+        yield
+    finally:
+        _recording.reset(token)
+
+
+@contextmanager
+def serializer_timer():
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serializer_time += time.perf_counter() - start
+
+
+def query_budget(budget: int, **per_method: int) -> Callable:
+    # query_budget(2, POST=10): отдельный бюджет для метода, иначе общий
+    def decorator(view):
+        view.query_budget = budget
+        view.query_budgets = per_method
+        return view
+
+    return decorator
+
+
+def _view_name(request) -> tuple[str, int | None]:
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return "unresolved", None
+    budgets = getattr(match.func, "query_budgets", {})
+    return match.view_name or match._func_path, budgets.get(
+        request.method, getattr(match.func, "query_budget", None)
+    )
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        metrics.view, budget = _view_name(request)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with _instrument_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.total_time = time.perf_counter() - start
+        if not response.streaming:
+            metrics.response_size = len(response.content)
+        if _recording.get():
+            registry.record(metrics)
+        response["Server-Timing"] = metrics.server_timing()
+        response.request_metrics = metrics
+        response.query_budget = budget
+        return response
+
+
+@contextmanager
+def _instrument_connections(metrics: RequestMetrics):
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        yield
+
+
+def database_pool_stats() -> dict[str, dict]:
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is None:
+            continue
+        raw = pool.get_stats()
+        queued = raw.get("requests_queued", 0)
+        stats[alias] = {
+            "min_size": raw.get("pool_min", 0),
+            "max_size": raw.get("pool_max", 0),
+            "size": raw.get("pool_size", 0),
+            "available": raw.get("pool_available", 0),
+            "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+            "waiting": raw.get("requests_waiting", 0),
+            "requests": raw.get("requests_num", 0),
+            "requests_queued": queued,
+            "wait_ms_total": raw.get("requests_wait_ms", 0),
+            "wait_ms_avg": raw.get("requests_wait_ms", 0) / queued if queued else 0,
+            "timeouts": raw.get("requests_errors", 0),
+            "connections_lost": raw.get("connections_lost", 0),
+        }
+    return stats
+
+
+def render_pool_prometheus() -> str:
+    lines = []
+    for name in ("size", "available", "in_use", "waiting", "wait_ms_total"):
+        metric = f"mis_db_pool_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        for alias, stats in database_pool_stats().items():
+            lines.append(f'{metric}{{alias="{alias}"}} {stats[name]}')
+    return "\n".join(lines) + "\n"
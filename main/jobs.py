@@ -0,0 +1,190 @@
+import logging
+import random
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from main.db_router import use_primary
+from main.models import IdempotencyKey, Job
+from main.profiles import refresh_doctor_profiles
+
+logger = logging.getLogger(__name__)
+
+_tasks: dict[str, Callable[..., Any]] = {}
+
+
+def task(name: str) -> Callable:
+    def decorator(func):
+        _tasks[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(
+    name: str,
+    payload: dict[str, Any] | None = None,
+    *,
+    queue: str = "default",
+    delay: float = 0,
+    max_attempts: int = 5,
+) -> Job | None:
+    # Задача вставляется в текущую транзакцию и станет видна воркерам
+    # только вместе с изменениями, которые её породили
+    if name not in _tasks:
+        raise KeyError(f"Неизвестная задача: {name}")
+    if settings.JOBS_RUN_INLINE:
+        transaction.on_commit(lambda: _tasks[name](**(payload or {})))
+        return None
+    return Job.objects.create(
+        queue=queue,
+        task=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+    )
+
+
+def claim(worker_id: str, queue: str = "default", batch_size: int = 10) -> list[Job]:
+    with use_primary(), transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.QUEUED, queue=queue, run_at__lte=timezone.now())
+            .order_by("run_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status=Job.Status.RUNNING,
+            locked_at=timezone.now(),
+            locked_by=worker_id,
+            attempts=F("attempts") + 1,
+        )
+        return list(Job.objects.filter(id__in=ids).order_by("run_at"))
+
+
+def backoff(attempts: int) -> timedelta:
+    base = settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(
+        seconds=min(base, settings.JOBS_RETRY_MAX_SECONDS) * random.uniform(0.8, 1.2)
+    )
+
+
+class LostLock(Exception):
+    pass
+
+
+def _owned(job: Job):
+    # задачу, которую requeue_stale вернул в очередь и взял другой воркер,
+    # прежний владелец уже не может ни завершить, ни перезапланировать
+    return Job.objects.filter(
+        id=job.id,
+        status=Job.Status.RUNNING,
+        locked_by=job.locked_by,
+        locked_at=job.locked_at,
+    )
+
+
+def run(job: Job) -> bool:
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise KeyError(f"Неизвестная задача: {job.task}")
+        with transaction.atomic():
+            func(**job.payload)
+            # отметка о выполнении в той же транзакции, что и сама работа:
+            # без владения задачей её результат откатывается
+            if not _owned(job).update(
+                status=Job.Status.DONE, finished_at=timezone.now()
+            ):
+                raise LostLock(job.id)
+    except LostLock:
+        logger.warning("Задача %s (%s) уже не принадлежит воркеру", job.task, job.id)
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Задача %s (%s) упала: %s", job.task, job.id, error)
+        if job.attempts >= job.max_attempts:
+            _owned(job).update(
+                status=Job.Status.FAILED,
+                last_error=error,
+                finished_at=timezone.now(),
+            )
+        else:
+            _owned(job).update(
+                status=Job.Status.QUEUED,
+                last_error=error,
+                run_at=timezone.now() + backoff(job.attempts),
+                locked_at=None,
+                locked_by="",
+            )
+        return False
+    return True
+
+
+def requeue_stale(timeout: float) -> int:
+    # задачи воркеров, умерших посреди выполнения, возвращаются в очередь;
+    # исчерпавшие попытки (например, роняющие сам воркер) помечаются упавшими
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED,
+        last_error="Воркер не завершил задачу за JOBS_VISIBILITY_TIMEOUT",
+        finished_at=timezone.now(),
+    )
+    return stale.update(status=Job.Status.QUEUED, locked_at=None, locked_by="")
+
+
+def purge_finished(older_than: timedelta) -> int:
+    deleted, _ = Job.objects.filter(
+        status=Job.Status.DONE, finished_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
+
+
+def job_stats(window: int = 60) -> dict[str, dict[str, int]]:
+    # по запросу на состояние: каждый читает только свой частичный индекс
+    since = timezone.now() - timedelta(seconds=window)
+    counts = {
+        "queued": Job.objects.filter(status=Job.Status.QUEUED),
+        "running": Job.objects.filter(status=Job.Status.RUNNING),
+        "failed": Job.objects.filter(status=Job.Status.FAILED),
+        "done_recently": Job.objects.filter(
+            status=Job.Status.DONE, finished_at__gte=since
+        ),
+    }
+    stats = defaultdict(lambda: dict.fromkeys(counts, 0))
+    for name, queryset in counts.items():
+        for queue, count in queryset.values_list("queue").annotate(Count("id")):
+            stats[queue][name] = count
+    return dict(stats)
+
+
+def render_jobs_prometheus() -> str:
+    stats = job_stats()
+    lines = []
+    for name in ("queued", "running", "failed", "done_recently"):
+        metric = f"mis_jobs_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        for queue, row in sorted(stats.items()):
+            lines.append(f'{metric}{{queue="{queue}"}} {row[name]}')
+    return "\n".join(lines) + "\n"
+
+
+@task("refresh_doctor_profiles")
+def refresh_doctor_profiles_task(doctor_ids: list[str]) -> None:
+    refresh_doctor_profiles(doctor_ids)
+
+
+@task("purge_idempotency_keys")
+def purge_idempotency_keys_task() -> None:
+    IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
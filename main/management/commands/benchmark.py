@@ -0,0 +1,143 @@
+import datetime
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Consultation, Doctor, Patient
+from main.search import search_patients
+from main.serializers.consult_serializer import (
+    ConsultationReadSerializer,
+    ConsultationWriteSerializer,
+)
+from main.serializers.patient_serializer import PatientSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Замеряет горячие пути (p50/p99, запросы на операцию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Путь для JSON-отчёта")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.page_size = options["page_size"]
+        self.doctors = list(
+            Doctor.objects.filter(clinics__isnull=False).values_list(
+                "id", "clinics__id"
+            )[:1000]
+        )
+        self.patient_ids = list(Patient.objects.values_list("id", flat=True)[:1000])
+        self.last_names = list(
+            Patient.objects.values_list("last_name", flat=True).distinct()[:100]
+        )
+        bounds = Consultation.objects.order_by("start_time").values_list(
+            "start_time", flat=True
+        )
+        if not self.doctors or not self.patient_ids or not bounds.exists():
+            raise CommandError("Нет данных: сначала запустите generate_data")
+        self.first_start = bounds.first()
+        self.last_start = bounds.last()
+
+        cases = {
+            "booking_validation": self.booking_validation,
+            "person_create": self.person_create,
+            "consultation_list": self.consultation_list,
+            "patient_search": self.patient_search,
+        }
+        report = {
+            "vendor": connection.vendor,
+            "iterations": options["iterations"],
+            "results": {
+                name: self.measure(case, options["iterations"])
+                for name, case in cases.items()
+            },
+        }
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:<20} p50={result['p50_ms']:8.2f}ms "
+                f"p99={result['p99_ms']:8.2f}ms "
+                f"queries/op={result['queries_per_op']:.1f}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+    def measure(self, case, iterations: int) -> dict:
+        timings = []
+        queries = 0
+        for i in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                case(i)
+                timings.append(time.perf_counter() - start)
+            queries += len(context)
+        return {
+            "p50_ms": _percentile(timings, 50) * 1000,
+            "p99_ms": _percentile(timings, 99) * 1000,
+            "mean_ms": statistics.fmean(timings) * 1000,
+            "queries_per_op": queries / iterations,
+        }
+
+    def booking_validation(self, i):
+        doctor_id, clinic_id = self.rng.choice(self.doctors)
+        span = (self.last_start - self.first_start).total_seconds()
+        start_time = self.first_start + datetime.timedelta(
+            seconds=self.rng.uniform(0, span)
+        )
+        serializer = ConsultationWriteSerializer(
+            data={
+                "start_time": start_time,
+                "end_time": start_time + datetime.timedelta(minutes=30),
+                "doctor": doctor_id,
+                "patient": self.rng.choice(self.patient_ids),
+                "clinic": clinic_id,
+            }
+        )
+        serializer.is_valid()
+
+    def person_create(self, i):
+        serializer = PatientSerializer(
+            data={
+                "first_name": "Бенчмарк",
+                "last_name": "Бенчмарков",
+                "date_birth": "1990-01-01",
+                "sex": Patient.SexChoices.FEMALE,
+                "email": f"benchmark{i}@bench.example.com",
+                "phone_number": f"+79{i:09d}",
+                "password": "Benchmark1",
+            }
+        )
+        try:
+            with transaction.atomic():
+                if serializer.is_valid():
+                    serializer.save()
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def consultation_list(self, i):
+        queryset = ConsultationReadSerializer.setup_eager_loading(
+            Consultation.objects.filter(doctor_id=self.rng.choice(self.doctors)[0])
+        ).order_by("start_time")[: self.page_size]
+        ConsultationReadSerializer(queryset, many=True).data
+
+    def patient_search(self, i):
+        list(search_patients(self.rng.choice(self.last_names)[:3]))
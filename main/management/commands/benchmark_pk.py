@@ -0,0 +1,88 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from main.ids import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+class Command(BaseCommand):
+    help = "Сравнивает скорость вставки и размер индекса первичного ключа для UUIDv4 и UUIDv7"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--output", help="Путь для JSON-отчёта")
+
+    def handle(self, *args, **options):
+        report = {"vendor": connection.vendor, "rows": options["rows"], "results": {}}
+        for name, generator in GENERATORS.items():
+            result = self.run_case(
+                f"bench_pk_{name}", generator, options["rows"], options["batch_size"]
+            )
+            report["results"][name] = result
+            self.stdout.write(
+                f"{name}: {result['rows_per_second']:,.0f} строк/с, "
+                f"индекс PK: {self.format_size(result['index_bytes'])}, "
+                f"таблица: {self.format_size(result['table_bytes'])}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+    def run_case(self, table, generator, rows, batch_size):
+        uuid_type = "uuid" if connection.vendor == "postgresql" else "char(32)"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE TABLE {table} (id {uuid_type} PRIMARY KEY, payload varchar(64))"
+            )
+            try:
+                elapsed = 0.0
+                for start in range(0, rows, batch_size):
+                    count = min(batch_size, rows - start)
+                    params = [(self.adapt(generator()), "x" * 64) for _ in range(count)]
+                    started = time.perf_counter()
+                    with transaction.atomic():
+                        cursor.executemany(
+                            f"INSERT INTO {table} (id, payload) VALUES (%s, %s)",
+                            params,
+                        )
+                    elapsed += time.perf_counter() - started
+                index_bytes, table_bytes = self.sizes(cursor, table)
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        return {
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed else 0,
+            "index_bytes": index_bytes,
+            "table_bytes": table_bytes,
+        }
+
+    def adapt(self, value):
+        return value if connection.vendor == "postgresql" else value.hex
+
+    def sizes(self, cursor, table):
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT pg_relation_size(%s), pg_relation_size(%s)",
+                [f"{table}_pkey", table],
+            )
+            return cursor.fetchone()
+        try:
+            cursor.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE tbl_name = %s GROUP BY name",
+                [table],
+            )
+        except DatabaseError:
+            return None, None
+        sizes = dict(cursor.fetchall())
+        index_bytes = sum(size for name, size in sizes.items() if name != table)
+        return index_bytes, sizes.get(table)
+
+    def format_size(self, size):
+        return "н/д" if size is None else f"{size / 1024 / 1024:.1f} МБ"
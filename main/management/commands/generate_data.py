@@ -0,0 +1,147 @@
+import datetime
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import Clinic, Consultation, Doctor, DoctorEducation, Patient
+from main.profiles import rebuild_doctor_profiles
+
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Олег", "Елена", "Сергей", "Ольга"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Волков"]
+SPECIALIZATIONS = ["Терапевт", "Хирург", "Кардиолог", "Невролог", "Офтальмолог"]
+SLOT = datetime.timedelta(minutes=30)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Генерирует синтетические данные заданного масштаба для бенчмарков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clinics", type=int, default=20)
+        parser.add_argument("--doctors", type=int, default=500)
+        parser.add_argument("--patients", type=int, default=50_000)
+        parser.add_argument("--consultations", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        password = make_password("Benchmark1")
+        today = timezone.now().date()
+        # повторный запуск продолжает нумерацию: email и телефоны уникальны
+        doctor_offset = Doctor.all_objects.filter(
+            email__endswith="@bench.example.com"
+        ).count()
+        patient_offset = Patient.all_objects.filter(
+            email__endswith="@bench.example.com"
+        ).count()
+
+        with transaction.atomic():
+            clinics = Clinic.objects.bulk_create(
+                Clinic(
+                    name=f"Клиника {i}",
+                    registered_adress=f"г. Москва, ул. Юридическая, {i}",
+                    actual_adress=f"г. Москва, ул. Фактическая, {i}",
+                )
+                for i in range(options["clinics"])
+            )
+            doctors = Doctor.objects.bulk_create(
+                (
+                    Doctor(
+                        first_name=rng.choice(FIRST_NAMES),
+                        last_name=rng.choice(LAST_NAMES),
+                        date_birth=today
+                        - datetime.timedelta(days=rng.randint(9000, 22000)),
+                        sex=rng.choice(Doctor.SexChoices.values),
+                        password=password,
+                        email=f"doctor{i}@bench.example.com",
+                        phone_number=f"+71{i:09d}",
+                        specialization=rng.choice(SPECIALIZATIONS),
+                        date_start_work=today
+                        - datetime.timedelta(days=rng.randint(365, 9000)),
+                    )
+                    for i in range(doctor_offset, doctor_offset + options["doctors"])
+                ),
+                batch_size=batch_size,
+            )
+            Clinic.doctors.through.objects.bulk_create(
+                (
+                    Clinic.doctors.through(
+                        clinic_id=clinics[i % len(clinics)].id, doctor_id=doctor.id
+                    )
+                    for i, doctor in enumerate(doctors)
+                ),
+                batch_size=batch_size,
+            )
+            DoctorEducation.objects.bulk_create(
+                (
+                    DoctorEducation(
+                        doctor=doctor,
+                        university="Первый МГМУ",
+                        faculty="Лечебный",
+                        date_start=doctor.date_start_work
+                        - datetime.timedelta(days=6 * 365),
+                        date_end=doctor.date_start_work,
+                    )
+                    for doctor in doctors
+                ),
+                batch_size=batch_size,
+            )
+            patient_ids = []
+            for batch in _batched(
+                (
+                    Patient(
+                        first_name=rng.choice(FIRST_NAMES),
+                        last_name=rng.choice(LAST_NAMES),
+                        date_birth=today
+                        - datetime.timedelta(days=rng.randint(365, 30000)),
+                        sex=rng.choice(Patient.SexChoices.values),
+                        password=password,
+                        email=f"patient{i}@bench.example.com",
+                        phone_number=f"+72{i:09d}",
+                    )
+                    for i in range(patient_offset, patient_offset + options["patients"])
+                ),
+                batch_size,
+            ):
+                patient_ids.extend(p.id for p in Patient.objects.bulk_create(batch))
+
+        # Слоты идут подряд по каждому врачу, поэтому пересечений нет
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        start += datetime.timedelta(days=1)
+        statuses = Consultation.Status.values
+        consultations = (
+            Consultation(
+                start_time=start + SLOT * (i // len(doctors)),
+                end_time=start + SLOT * (i // len(doctors) + 1),
+                status=rng.choice(statuses),
+                doctor_id=doctors[i % len(doctors)].id,
+                clinic_id=clinics[(i % len(doctors)) % len(clinics)].id,
+                patient_id=rng.choice(patient_ids),
+            )
+            for i in range(options["consultations"])
+        )
+        created = 0
+        for batch in _batched(consultations, batch_size):
+            with transaction.atomic():
+                Consultation.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f"Консультаций: {created}", ending="\r")
+
+        rebuild_doctor_profiles()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nСоздано: клиник {len(clinics)}, врачей {len(doctors)}, "
+                f"пациентов {len(patient_ids)}, консультаций {created}"
+            )
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.jobs import job_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает состояние очередей фоновых задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window", type=int, default=60)
+
+    def handle(self, *args, **options):
+        window = options["window"]
+        for queue, row in sorted(job_stats(window).items()):
+            self.stdout.write(
+                f"{queue}: в очереди {row['queued']}, выполняется {row['running']}, "
+                f"с ошибкой {row['failed']}, "
+                f"пропускная способность {row['done_recently'] / window:.1f} задач/с"
+            )
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main.instrumentation import database_pool_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает настройки пула соединений и распределение соединений "
+        "к базе по состояниям (pg_stat_activity)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        pool_options = connection.settings_dict["OPTIONS"].get("pool")
+        self.stdout.write(f"Настройки пула: {json.dumps(pool_options)}")
+        if connection.vendor != "postgresql":
+            self.stdout.write("pg_stat_activity доступна только для PostgreSQL")
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT application_name, state, count(*), "
+                "max(now() - state_change) "
+                "FROM pg_stat_activity WHERE datname = current_database() "
+                "GROUP BY application_name, state ORDER BY 3 DESC"
+            )
+            rows = cursor.fetchall()
+        self.stdout.write("Соединения к базе (все процессы):")
+        for application_name, state, count, longest in rows:
+            self.stdout.write(
+                f"  {application_name or '-':<24} {state or '-':<20} "
+                f"{count:>5}  max в состоянии: {longest}"
+            )
+        stats = database_pool_stats().get(options["database"])
+        if stats:
+            self.stdout.write(
+                f"Пул этого процесса: {json.dumps(stats, ensure_ascii=False)}"
+            )
@@ -0,0 +1,124 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+CHILD = (
+    "import json, sys\n"
+    "from main.warmup import measure_startup\n"
+    "print(json.dumps(measure_startup(**json.loads(sys.argv[1]))))\n"
+)
+# без --user замеряются только публичные URL: закрытые ответили бы 403
+# без единого запроса к базе
+PUBLIC_PATHS = ["/api/doctors/"]
+AUTHENTICATED_PATHS = ["/api/consultations/", "/api/patients/search/?q=а"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет холодный старт воркера в отдельных процессах: импорт, "
+        "прогрев (main.warmup) и первые запросы против повторных"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", action="append", dest="paths", help="URL для GET-запроса"
+        )
+        parser.add_argument(
+            "--user",
+            help="Имя пользователя, от которого идут запросы (force_login); "
+            "добавляет к URL по умолчанию закрытые",
+        )
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument(
+            "--no-warmup", action="store_true", help="Без main.warmup.warm_up()"
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help="Ошибка, если медиана какого-либо первого запроса дольше (мс)",
+        )
+        parser.add_argument("--output", help="Путь для JSON-отчёта")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or (
+            PUBLIC_PATHS + AUTHENTICATED_PATHS if options["user"] else PUBLIC_PATHS
+        )
+        arguments = json.dumps(
+            {
+                "paths": paths,
+                "warmup": not options["no_warmup"],
+                "username": options["user"],
+            }
+        )
+        runs = []
+        for _ in range(options["runs"]):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", CHILD, arguments],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            wall = time.perf_counter() - start
+            if result.returncode:
+                raise CommandError(result.stderr.strip().splitlines()[-1])
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            report["wall"] = wall
+            runs.append(report)
+
+        def median_ms(values):
+            return statistics.median(values) * 1000
+
+        summary = {"process_wall": median_ms([run["wall"] for run in runs])}
+        self.stdout.write(
+            f"Процесс целиком (интерпретатор, импорт, запросы): "
+            f"{summary['process_wall']:.1f} мс"
+        )
+        for stage in runs[0]["stages"]:
+            summary[stage] = median_ms([run["stages"][stage] for run in runs])
+            self.stdout.write(f"  {stage:<24} {summary[stage]:8.1f} мс")
+        for step in runs[0]["warm_up"]:
+            summary[f"warm_up.{step}"] = median_ms(
+                [run["warm_up"][step] for run in runs]
+            )
+            self.stdout.write(
+                f"  warm_up.{step:<16} {summary[f'warm_up.{step}']:8.1f} мс"
+            )
+
+        self.stdout.write(f"{'запрос':<40} {'первый':>9} {'повторный':>10} запросов")
+        first_requests = []
+        for index in range(0, len(runs[0]["requests"]), 2):
+            first = median_ms([run["requests"][index]["seconds"] for run in runs])
+            second = median_ms([run["requests"][index + 1]["seconds"] for run in runs])
+            request = runs[0]["requests"][index]
+            first_requests.append(first)
+            summary[request["path"]] = {"first": first, "second": second}
+            self.stdout.write(
+                f"{request['path']:<40} {first:7.1f}мс {second:8.1f}мс "
+                f"{request['queries']:>4} (HTTP {request['status']})"
+            )
+
+        denied = {
+            request["path"]: None
+            for request in runs[0]["requests"]
+            if request["status"] in (401, 403)
+        }
+        if denied:
+            raise CommandError(
+                f"Доступ запрещён для {', '.join(denied)}: замер показал бы "
+                f"отказ, а не холодный старт; укажите --user"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"summary": summary, "runs": runs}, output, indent=2)
+        slowest = max(first_requests)
+        if options["budget"] is not None and slowest > options["budget"]:
+            raise CommandError(
+                f"Первый запрос {slowest:.1f} мс дольше "
+                f"бюджета {options['budget']} мс"
+            )
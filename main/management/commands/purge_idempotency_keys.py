@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Удаляет ключи идемпотентности с истёкшим сроком хранения"
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"Удалено ключей: {deleted}"))
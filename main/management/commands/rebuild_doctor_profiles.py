@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.profiles import rebuild_doctor_profiles
+
+
+class Command(BaseCommand):
+    help = "Пересобирает денормализованные профили врачей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = rebuild_doctor_profiles(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Обновлено профилей: {total}"))
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+
+from main.jobs import claim, purge_finished, requeue_stale, run
+
+
+class Command(BaseCommand):
+    help = "Запускает воркеры фоновых задач (SELECT ... FOR UPDATE SKIP LOCKED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default="default")
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--stats-interval", type=float, default=60.0)
+        parser.add_argument(
+            "--burst", action="store_true", help="Завершиться, когда очередь пуста"
+        )
+
+    def handle(self, *args, **options):
+        if (
+            options["processes"] > 1
+            and not connection.features.has_select_for_update_skip_locked
+        ):
+            raise CommandError("Несколько процессов требуют SKIP LOCKED (PostgreSQL)")
+        if options["processes"] == 1:
+            self.work(options)
+            return
+        # соединения не должны переживать fork: каждый процесс открывает свои
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+
+    def work(self, options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        done = failed = 0
+        window_start = last_requeue = last_purge = time.monotonic()
+        self.stdout.write(f"Воркер {worker_id} слушает очередь {options['queue']}")
+        while not stopping:
+            close_old_connections()
+            now = time.monotonic()
+            if now - last_requeue > settings.JOBS_VISIBILITY_TIMEOUT / 2:
+                requeue_stale(settings.JOBS_VISIBILITY_TIMEOUT)
+                last_requeue = now
+            if now - last_purge > settings.JOBS_PURGE_INTERVAL:
+                purge_finished(timedelta(seconds=settings.JOBS_DONE_RETENTION))
+                last_purge = now
+            jobs = claim(worker_id, options["queue"], options["batch_size"])
+            for job in jobs:
+                if run(job):
+                    done += 1
+                else:
+                    failed += 1
+            elapsed = time.monotonic() - window_start
+            if elapsed >= options["stats_interval"]:
+                self.stdout.write(
+                    f"{worker_id}: {done / elapsed:.1f} задач/с, "
+                    f"выполнено {done}, с ошибкой {failed}"
+                )
+                done = failed = 0
+                window_start = time.monotonic()
+            if not jobs:
+                if options["burst"]:
+                    break
+                time.sleep(options["poll_interval"])
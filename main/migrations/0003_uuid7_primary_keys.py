@@ -0,0 +1,85 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:10
+
+import django.db.models.deletion
+import main.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0002_doctor_profile"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="admin",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="clinic",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="consultation",
+            name="doctor",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="consultations",
+                to="main.doctor",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="consultation",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="doctor",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="doctoreducation",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="patient",
+            name="id",
+            field=models.UUIDField(
+                default=main.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0004_consultation_version_idempotency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="admin",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="clinic",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="doctor",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="admin",
+            index=models.Index(fields=["updated_at", "id"], name="admin_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clinic",
+            index=models.Index(fields=["updated_at", "id"], name="clinic_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="consultation",
+            index=models.Index(
+                fields=["updated_at", "id"], name="consultation_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(fields=["updated_at", "id"], name="doctor_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(fields=["updated_at", "id"], name="patient_updated_idx"),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:22
+
+import django.core.serializers.json
+import main.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0006_job_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEntry",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=main.ids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("entity_type", models.CharField(max_length=50)),
+                ("entity_id", models.UUIDField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("create", "Создание"),
+                            ("update", "Изменение"),
+                            ("soft_delete", "Пометка на удаление"),
+                            ("restore", "Восстановление"),
+                            ("delete", "Удаление"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "changes",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("actor", models.CharField(blank=True, max_length=100)),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Запись аудита",
+                "verbose_name_plural": "Журнал аудита",
+                "indexes": [
+                    models.Index(
+                        fields=["entity_type", "entity_id", "created_at"],
+                        name="audit_entity_idx",
+                    ),
+                    models.Index(
+                        fields=["entity_type", "created_at"], name="audit_time_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0007_audit_entry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="consultation",
+            index=models.Index(fields=["start_time"], name="consultation_start_idx"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # выбор значений поля sex разошёлся с 0001_initial ещё до профилей врачей;
+    # изменение только в состоянии миграций, схема БД не меняется
+
+    dependencies = [
+        ('main', '0008_consultation_start_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='admin',
+            name='sex',
+            field=models.CharField(choices=[('male', 'Мужской'), ('female', 'Женский')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='sex',
+            field=models.CharField(choices=[('male', 'Мужской'), ('female', 'Женский')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='sex',
+            field=models.CharField(choices=[('male', 'Мужской'), ('female', 'Женский')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0009_person_sex_choices"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "done")),
+                fields=["finished_at"],
+                name="job_done_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "failed")),
+                fields=["queue"],
+                name="job_failed_idx",
+            ),
+        ),
+    ]
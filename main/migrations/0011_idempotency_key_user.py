@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-19 00:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0010_job_stats_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="idempotencykey",
+            name="unique_idempotency_key",
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("user", "endpoint", "key"), name="unique_idempotency_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_idempotency_key_user"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="consultation",
+            name="consultation_start_idx",
+        ),
+        migrations.AddIndex(
+            model_name="consultation",
+            index=models.Index(
+                fields=["start_time", "id"], name="consultation_start_idx"
+            ),
+        ),
+    ]
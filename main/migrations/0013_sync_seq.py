@@ -0,0 +1,138 @@
+# Generated by Django 5.2.11 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+# sync_seq — номер изменения для лент /api/sync/, его ставит триггер на
+# любой INSERT/UPDATE (в том числе QuerySet.update()).
+# PostgreSQL: xid транзакции; лента отдаёт только строки с xid меньше xmin
+# текущего снимка, то есть транзакций, которые уже не могут закоммититься.
+# SQLite: пишущие транзакции идут по одной, и счётчик растёт в порядке коммита;
+# SQLite пересоздаёт таблицу при изменении схемы, такие миграции должны
+# создать триггеры заново.
+TABLES = [
+    "main_admin",
+    "main_clinic",
+    "main_consultation",
+    "main_doctor",
+    "main_patient",
+]
+
+POSTGRESQL_FUNCTION = """
+CREATE OR REPLACE FUNCTION main_set_sync_seq() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_seq := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def create_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRESQL_FUNCTION)
+        for table in TABLES:
+            schema_editor.execute(
+                f"CREATE TRIGGER {table}_sync_seq BEFORE INSERT OR UPDATE "
+                f"ON {table} FOR EACH ROW EXECUTE FUNCTION main_set_sync_seq()"
+            )
+    elif connection.vendor == "sqlite":
+        for table in TABLES:
+            for event in ("INSERT", "UPDATE"):
+                schema_editor.execute(
+                    f"CREATE TRIGGER {table}_sync_seq_{event.lower()} "
+                    f"AFTER {event} ON {table} BEGIN "
+                    f"UPDATE {table} SET sync_seq = "
+                    f"(SELECT COALESCE(MAX(sync_seq), 0) + 1 FROM {table}) "
+                    f"WHERE id = NEW.id; END"
+                )
+
+
+def drop_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        for table in TABLES:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_sync_seq ON {table}")
+        schema_editor.execute("DROP FUNCTION IF EXISTS main_set_sync_seq()")
+    elif connection.vendor == "sqlite":
+        for table in TABLES:
+            for event in ("insert", "update"):
+                schema_editor.execute(
+                    f"DROP TRIGGER IF EXISTS {table}_sync_seq_{event}"
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_consultation_start_id_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="admin",
+            name="admin_updated_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="clinic",
+            name="clinic_updated_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="consultation",
+            name="consultation_updated_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="doctor",
+            name="doctor_updated_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="patient",
+            name="patient_updated_idx",
+        ),
+        migrations.AddField(
+            model_name="admin",
+            name="sync_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="clinic",
+            name="sync_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="consultation",
+            name="sync_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="doctor",
+            name="sync_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="sync_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="admin",
+            index=models.Index(fields=["sync_seq", "id"], name="admin_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clinic",
+            index=models.Index(fields=["sync_seq", "id"], name="clinic_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="consultation",
+            index=models.Index(fields=["sync_seq", "id"], name="consultation_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(fields=["sync_seq", "id"], name="doctor_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(fields=["sync_seq", "id"], name="patient_sync_idx"),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
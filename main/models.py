@@ -1,19 +1,36 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Exists, F, OuterRef
+from django.db.models.signals import post_save
 import re
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-import uuid
+from .exceptions import VersionConflict
+from .ids import uuid7
 from .manager import ActiveManager
 
+# компилируются при импорте, а не в первом запросе воркера
+PHONE_NUMBER_RE = re.compile(r"^\+7\d{10}$")
+EMAIL_RE = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+
+
+class LoadedValuesMixin:
+    # значения полей на момент загрузки из БД, для диффа аудита и событий
+    # расписания; сохраняются без обработчика post_init на каждый экземпляр
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class Person(models.Model):
     class SexChoices(models.TextChoices):
         MALE = "male", "Мужской"
         FEMALE = "female", "Женский"
 
-    id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
-    )
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     patronymic_name = models.CharField(max_length=100, blank=True, null=True)
@@ -23,12 +40,15 @@ class Person(models.Model):
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=12, unique=True)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
 
     objects = ActiveManager()
     all_objects = models.Manager()
 
     class Meta:
         abstract = True
+        indexes = [models.Index(fields=["sync_seq", "id"], name="%(class)s_sync_idx")]
 
     def __str__(self) -> str:
         return self.get_full_name()
@@ -58,15 +78,16 @@ class Person(models.Model):
                 raise ValidationError({"date_birth": "Некорректная дата рождения"})
         if self.phone_number:
             phone = self.phone_number.replace(" ", "")
-            phone_regex = re.compile(r"^\+7\d{10}$")
-            if not phone_regex.match(phone):
+            if not PHONE_NUMBER_RE.match(phone):
                 raise ValidationError(
                     {"phone_number": "Телефон должен быть в формате +7XXXXXXXXXX"}
                 )
             self.phone_number = phone
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    def save(self, *args, validated=False, **kwargs):
+        # validated=True: email и телефон уже проверены PersonSerializer
+        # по всем таблицам людей, validate_unique() повторяет те же запросы
+        self.full_clean(validate_unique=not validated)
         super().save(*args, **kwargs)
 
 
@@ -96,12 +117,12 @@ class Doctor(Person):
                 {"date_start_work": "Дата начала работы не может быть в будущем"}
             )
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    def save(self, *args, validated=False, **kwargs):
+        self.full_clean(validate_unique=not validated)
         super().save(*args, **kwargs)
 
 
-class Patient(Person):
+class Patient(LoadedValuesMixin, Person):
     class Meta(Person.Meta):
         verbose_name = "Пациент"
         verbose_name_plural = "Пациенты"
@@ -114,19 +135,20 @@ class Admin(Person):
 
 
 class Clinic(models.Model):
-    id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
-    )
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     doctors = models.ManyToManyField(Doctor, related_name="clinics")
     name = models.CharField(max_length=100)
     registered_adress = models.CharField(max_length=150)
     actual_adress = models.CharField(max_length=150)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
 
     objects = ActiveManager()
     all_objects = models.Manager()
 
     class Meta:
+        indexes = [models.Index(fields=["sync_seq", "id"], name="clinic_sync_idx")]
         verbose_name = "Клиника"
         verbose_name_plural = "Клиники"
 
@@ -134,16 +156,14 @@ class Clinic(models.Model):
         return f"Клиника {self.name}, Юридический адрес: {self.registered_adress}, Фактический адрес: {self.actual_adress}"
 
 
-class Consultation(models.Model):
+class Consultation(LoadedValuesMixin, models.Model):
     class Status(models.TextChoices):
         CONFIRMED = "confirmed", "Подтверждена"
         WAITED = "waited", "Ожидает"
         STARTED = "started", "Начата"
         COMPLETED = "completed", "Завершена"
 
-    id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
-    )
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     start_time = models.DateTimeField()
@@ -151,8 +171,9 @@ class Consultation(models.Model):
     status = models.CharField(
         max_length=20, choices=Status.choices, default=Status.WAITED
     )
+    # индекс по doctor покрывается ведущим столбцом unique_doctor_time
     doctor = models.ForeignKey(
-        Doctor, on_delete=models.CASCADE, related_name="consultations"
+        Doctor, on_delete=models.CASCADE, related_name="consultations", db_index=False
     )
     patient = models.ForeignKey(
         Patient, on_delete=models.CASCADE, related_name="consultations"
@@ -161,6 +182,8 @@ class Consultation(models.Model):
         Clinic, on_delete=models.CASCADE, related_name="consultations"
     )
     is_deleted = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=1)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
 
     objects = ActiveManager()
     all_objects = models.Manager()
@@ -171,6 +194,10 @@ class Consultation(models.Model):
                 fields=["doctor", "start_time"], name="unique_doctor_time"
             )
         ]
+        indexes = [
+            models.Index(fields=["sync_seq", "id"], name="consultation_sync_idx"),
+            models.Index(fields=["start_time", "id"], name="consultation_start_idx"),
+        ]
         verbose_name = "Консультация"
         verbose_name_plural = "Консультации"
 
@@ -189,26 +216,106 @@ class Consultation(models.Model):
             raise ValidationError(
                 {"start_time": "Начало приема не может быть в прошлом"}
             )
-        overlapping = Consultation.objects.filter(
-            doctor=self.doctor,
-            start_time__lt=self.end_time,
-            end_time__gt=self.start_time,
-        ).exclude(pk=self.pk)
-        if overlapping.exists():
-            raise ValidationError("У врача уже есть консультация в это время")
-        if self.clinic and self.doctor:
-            if not self.clinic.doctors.filter(id=self.doctor.id).exists():
+        if self.doctor_id and self.clinic_id:
+            schedule = self.check_schedule()
+            if schedule["overlaps"] or schedule["slot_taken"]:
+                raise ValidationError("У врача уже есть консультация в это время")
+            if not schedule["works_in_clinic"]:
                 raise ValidationError("Этот врач не работает в выбранной клинике")
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+    def check_schedule(self) -> dict[str, bool]:
+        # Пересечения, занятость слота unique_doctor_time (с учётом удалённых
+        # записей) и работа врача в клинике проверяются одним запросом
+        others = Consultation.all_objects.filter(doctor_id=OuterRef("pk")).exclude(
+            pk=self.pk
+        )
+        return (
+            Doctor.all_objects.filter(pk=self.doctor_id)
+            .annotate(
+                overlaps=Exists(
+                    others.filter(
+                        is_deleted=False,
+                        start_time__lt=self.end_time,
+                        end_time__gt=self.start_time,
+                    )
+                ),
+                slot_taken=Exists(others.filter(start_time=self.start_time)),
+                works_in_clinic=Exists(
+                    Clinic.doctors.through.objects.filter(
+                        doctor_id=OuterRef("pk"), clinic_id=self.clinic_id
+                    )
+                ),
+            )
+            .values("overlaps", "slot_taken", "works_in_clinic")
+            .first()
+        ) or {"overlaps": False, "slot_taken": False, "works_in_clinic": False}
+
+    def save_versioned(self, expected_version: int, update_fields) -> bool:
+        # compare-and-swap: запись проходит, только если версия не изменилась
+        self.updated_at = timezone.now()
+        updated = Consultation.all_objects.filter(
+            pk=self.pk, version=expected_version
+        ).update(
+            **{field: getattr(self, field) for field in update_fields},
+            updated_at=self.updated_at,
+            version=F("version") + 1,
+        )
+        if updated:
+            self.version = expected_version + 1
+            # update() не шлёт post_save, а подписчики (push) должны узнать о правке
+            post_save.send(
+                sender=Consultation,
+                instance=self,
+                created=False,
+                update_fields=frozenset(update_fields),
+                raw=False,
+                using=self._state.db,
+            )
+        return bool(updated)
+
+    def save(self, *args, validated=False, **kwargs):
+        # validated=True: данные уже прошли ConsultationWriteSerializer,
+        # повторный full_clean() только дублирует его запросы
+        if not validated:
+            # unique_doctor_time покрывается check_schedule() в clean()
+            self.full_clean(validate_constraints=False)
+        if not self._state.adding:
+            # любая правка (админка, мягкое удаление) сдвигает версию и, как
+            # save_versioned, проходит только поверх загруженной версии:
+            # иначе она молча перезапишет чужое изменение (_do_update)
+            self._expected_version = self.version
+            self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        try:
+            super().save(*args, **kwargs)
+        except VersionConflict:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        updated = super()._do_update(
+            base_qs.filter(version=expected),
+            using,
+            pk_val,
+            values,
+            update_fields,
+            forced_update,
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict
+        return updated
 
 
-class DoctorEducation(models.Model):
-    id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
-    )
+class DoctorEducation(LoadedValuesMixin, models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     doctor = models.ForeignKey(
         Doctor,
         on_delete=models.CASCADE,
@@ -236,3 +343,122 @@ class DoctorEducation(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+
+
+class DoctorProfile(models.Model):
+    doctor = models.OneToOneField(
+        Doctor, on_delete=models.CASCADE, primary_key=True, related_name="profile"
+    )
+    document = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    is_deleted = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Профиль врача"
+        verbose_name_plural = "Профили врачей"
+
+
+class IdempotencyKey(models.Model):
+    # ключ уникален в пределах пользователя: одинаковые ключи разных
+    # клиентов не должны получать сохранённые ответы друг друга
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "endpoint", "key"], name="unique_idempotency_key"
+            )
+        ]
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = "queued", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    queue = models.CharField(max_length=50, default="default")
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["queue", "run_at"],
+                name="job_ready_idx",
+                condition=models.Q(status="queued"),
+            ),
+            models.Index(
+                fields=["locked_at"],
+                name="job_running_idx",
+                condition=models.Q(status="running"),
+            ),
+            # job_stats() и purge_finished() не читают всю таблицу
+            models.Index(
+                fields=["finished_at"],
+                name="job_done_idx",
+                condition=models.Q(status="done"),
+            ),
+            models.Index(
+                fields=["queue"],
+                name="job_failed_idx",
+                condition=models.Q(status="failed"),
+            ),
+        ]
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+
+
+class AuditEntry(models.Model):
+    class Action(models.TextChoices):
+        CREATE = "create", "Создание"
+        UPDATE = "update", "Изменение"
+        SOFT_DELETE = "soft_delete", "Пометка на удаление"
+        RESTORE = "restore", "Восстановление"
+        DELETE = "delete", "Удаление"
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    entity_type = models.CharField(max_length=50)
+    entity_id = models.UUIDField()
+    action = models.CharField(max_length=20, choices=Action.choices)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    actor = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["entity_type", "entity_id", "created_at"],
+                name="audit_entity_idx",
+            ),
+            models.Index(fields=["entity_type", "created_at"], name="audit_time_idx"),
+        ]
+        verbose_name = "Запись аудита"
+        verbose_name_plural = "Журнал аудита"
@@ -0,0 +1,99 @@
+import datetime
+import json
+from typing import Any, Iterable
+from uuid import UUID
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from main.db_router import use_primary
+from main.models import Clinic, Doctor, DoctorEducation, DoctorProfile
+from main.serializers.doctor_serializer import DoctorSerializer
+
+
+def _doctor_queryset():
+    return Doctor.all_objects.prefetch_related(
+        Prefetch(
+            "clinics",
+            queryset=Clinic.objects.only("id", "name", "actual_adress"),
+        ),
+        Prefetch(
+            "educations",
+            queryset=DoctorEducation.objects.order_by("date_start"),
+        ),
+    )
+
+
+def build_doctor_profile(doctor: Doctor) -> dict[str, Any]:
+    document = dict(DoctorSerializer(doctor).data)
+    document["clinics"] = [
+        {
+            "id": clinic.id,
+            "name": clinic.name,
+            "actual_address": clinic.actual_adress,
+        }
+        for clinic in doctor.clinics.all()
+    ]
+    document["educations"] = [
+        {
+            "id": education.id,
+            "university": education.university,
+            "faculty": education.faculty,
+            "date_start": education.date_start,
+            "date_end": education.date_end,
+        }
+        for education in doctor.educations.all()
+    ]
+    return json.loads(json.dumps(document, cls=DjangoJSONEncoder))
+
+
+def refresh_doctor_profiles(doctor_ids: Iterable[UUID]) -> int:
+    doctor_ids = set(doctor_ids)
+    if not doctor_ids:
+        return 0
+    with use_primary():
+        doctors = list(_doctor_queryset().filter(id__in=doctor_ids))
+    profiles = [
+        DoctorProfile(
+            doctor=doctor,
+            document=build_doctor_profile(doctor),
+            is_deleted=doctor.is_deleted,
+        )
+        for doctor in doctors
+    ]
+    DoctorProfile.objects.bulk_create(
+        profiles,
+        update_conflicts=True,
+        unique_fields=["doctor"],
+        update_fields=["document", "is_deleted", "refreshed_at"],
+    )
+    return len(profiles)
+
+
+def rebuild_doctor_profiles(batch_size: int = 500) -> int:
+    total = 0
+    ids = list(Doctor.all_objects.values_list("id", flat=True))
+    for start in range(0, len(ids), batch_size):
+        total += refresh_doctor_profiles(ids[start : start + batch_size])
+    return total
+
+
+def render_doctor_profile(document: dict[str, Any]) -> dict[str, Any]:
+    # age и experience зависят от текущей даты, поэтому пересчитываются при чтении
+    today = timezone.now().date()
+    document = dict(document)
+    date_birth = document.get("date_birth")
+    if date_birth:
+        born = datetime.date.fromisoformat(date_birth)
+        document["age"] = (
+            today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+        )
+    date_start_work = document.get("date_start_work")
+    if date_start_work:
+        date_end_work = document.get("date_end_work")
+        end = datetime.date.fromisoformat(date_end_work) if date_end_work else today
+        document["experience"] = (
+            end.year - datetime.date.fromisoformat(date_start_work).year
+        )
+    return document
@@ -0,0 +1,16 @@
+from django.db.models import Q, QuerySet
+
+from main.models import Patient
+
+
+def search_patients(term: str, limit: int = 50) -> QuerySet[Patient]:
+    term = term.strip()
+    if not term:
+        return Patient.objects.none()
+    if term.startswith("+"):
+        condition = Q(phone_number__startswith=term.replace(" ", ""))
+    elif "@" in term:
+        condition = Q(email__istartswith=term)
+    else:
+        condition = Q(last_name__istartswith=term) | Q(first_name__istartswith=term)
+    return Patient.objects.filter(condition).order_by("last_name", "first_name")[:limit]
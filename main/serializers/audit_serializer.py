@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from main.models import AuditEntry
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditEntry
+        fields = [
+            "id",
+            "entity_type",
+            "entity_id",
+            "action",
+            "changes",
+            "actor",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+class DateTimeRangeSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError(
+                "Начало периода должно быть раньше окончания"
+            )
+        return attrs
@@ -1,7 +1,8 @@
 import datetime
 from rest_framework import serializers
-from main.models import Doctor, Patient, Admin
-import re
+from rest_framework.fields import empty
+from main.db_router import use_primary
+from main.models import EMAIL_RE, PHONE_NUMBER_RE, Doctor, Patient, Admin
 
 
 class PersonSerializer(serializers.ModelSerializer):
@@ -14,22 +15,49 @@ class PersonSerializer(serializers.ModelSerializer):
             "last_name",
             "patronymic_name",
             "date_birth",
+            "sex",
             "sex_display",
             "age",
             "email",
             "phone_number",
+            "password",
+            "updated_at",
         ]
-        read_only_fields = ["id", "age"]
+        read_only_fields = ["id", "age", "updated_at"]
         extra_kwargs = {
             "password": {"write_only": True},
+            # уникальность по всем таблицам людей проверяют validate_email и
+            # validate_phone_number, автоматический UniqueValidator её дублирует
+            "email": {"validators": []},
+            "phone_number": {"validators": []},
         }
 
+    def run_validation(self, data=empty):
+        # проверки уникальности email и телефона выполняются на primary
+        with use_primary():
+            return super().run_validation(data)
+
+    def _taken_in_batch(self, field, value):
+        # пакетный API заранее загружает занятые значения одним запросом на таблицу
+        taken = self.context.get("taken", {}).get(field)
+        if taken is None:
+            return None
+        instance_id = self.instance.id if self.instance else None
+        return bool(taken.get(value, set()) - {instance_id})
+
     def validate_phone_number(self, value):
         phone = value.replace(" ", "")
-        if not re.match(r"^\+7\d{10}$", phone):
+        if not PHONE_NUMBER_RE.match(phone):
             raise serializers.ValidationError(
                 "Телефон должен быть в формате +7XXXXXXXXXX"
             )
+        taken = self._taken_in_batch("phone_number", phone)
+        if taken is not None:
+            if taken:
+                raise serializers.ValidationError(
+                    "Пользователь с таким номером телефона уже существует"
+                )
+            return phone
         instance = self.instance
         instance_id = instance.id if instance else None
         if (
@@ -68,10 +96,17 @@ class PersonSerializer(serializers.ModelSerializer):
         return value
 
     def validate_email(self, value):
-        if not re.match(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", value):
+        if not EMAIL_RE.match(value):
             raise serializers.ValidationError(
                 "Email должен быть в формате example@example.com"
             )
+        taken = self._taken_in_batch("email", value)
+        if taken is not None:
+            if taken:
+                raise serializers.ValidationError(
+                    "Пользователь с таким email уже существует"
+                )
+            return value
         instance = self.instance
         instance_id = instance.id if instance else None
         if Patient.all_objects.filter(email=value).exclude(id=instance_id).exists():
@@ -88,6 +123,17 @@ class PersonSerializer(serializers.ModelSerializer):
             )
         return value
 
+    def create(self, validated_data):
+        instance = self.Meta.model(**validated_data)
+        instance.save(validated=True)
+        return instance
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(validated=True)
+        return instance
+
     def validate_password(self, value):
         errors = []
         if len(value) < 8:
@@ -0,0 +1,32 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from main.batch import RESOURCES
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, max_length=100)
+    method = serializers.ChoiceField(choices=["create", "update"])
+    resource = serializers.ChoiceField(choices=sorted(RESOURCES))
+    pk = serializers.UUIDField(required=False)
+    data = serializers.DictField()
+
+    def validate(self, attrs):
+        if attrs["method"] == "update" and "pk" not in attrs:
+            raise serializers.ValidationError({"pk": "Для update укажите pk"})
+        return attrs
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=True)
+
+    def validate_operations(self, value):
+        if len(value) > settings.BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"Не больше {settings.BATCH_MAX_OPERATIONS} операций в пакете"
+            )
+        ids = [operation["id"] for operation in value if "id" in operation]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("id операций должны быть уникальны")
+        return value
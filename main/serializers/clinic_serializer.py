@@ -5,6 +5,8 @@ from .doctor_serializer import DoctorSerializer
 
 class ClinicSerializer(serializers.ModelSerializer):
     doctors = DoctorSerializer(many=True, read_only=True)
+    registered_address = serializers.CharField(source="registered_adress")
+    actual_address = serializers.CharField(source="actual_adress")
 
     class Meta:
         model = Clinic
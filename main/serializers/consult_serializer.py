@@ -1,5 +1,10 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.fields import empty
+from main.db_router import use_primary
+from main.exceptions import VersionConflict
 from main.models import Consultation
 from main.serializers.doctor_serializer import DoctorSerializer
 from main.serializers.patient_serializer import PatientSerializer
@@ -8,9 +13,9 @@ from main.models import Doctor, Patient, Clinic
 
 
 class ConsultationReadSerializer(serializers.ModelSerializer):
-    doctor = DoctorSerializer(source="doctor", read_only=True)
-    patient = PatientSerializer(source="patient", read_only=True)
-    clinic = ClinicSerializer(source="clinic", read_only=True)
+    doctor = DoctorSerializer(read_only=True)
+    patient = PatientSerializer(read_only=True)
+    clinic = ClinicSerializer(read_only=True)
 
     class Meta:
         model = Consultation
@@ -24,56 +29,130 @@ class ConsultationReadSerializer(serializers.ModelSerializer):
             "doctor",
             "patient",
             "clinic",
+            "version",
         ]
-        read_only_fields = ["id", "created_at", "updated_at"]
+        read_only_fields = ["id", "created_at", "updated_at", "version"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("doctor", "patient", "clinic").prefetch_related(
+            Prefetch("clinic__doctors", queryset=Doctor.objects.all())
+        )
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # пакетный API передаёт в context уже загруженные объекты: {Model: {pk: obj}}
+    def to_internal_value(self, data):
+        prefetched = self.context.get("prefetched", {}).get(self.queryset.model)
+        if prefetched is not None:
+            try:
+                return prefetched[self.queryset.model._meta.pk.to_python(data)]
+            except (KeyError, ValidationError):
+                pass
+        return super().to_internal_value(data)
 
 
 class ConsultationWriteSerializer(serializers.ModelSerializer):
-    doctor = serializers.PrimaryKeyRelatedField(
+    doctor = PrefetchedPrimaryKeyRelatedField(
         queryset=Doctor.objects.filter(is_deleted=False),
     )
-    patient = serializers.PrimaryKeyRelatedField(
+    patient = PrefetchedPrimaryKeyRelatedField(
         queryset=Patient.objects.filter(is_deleted=False),
     )
-    clinic = serializers.PrimaryKeyRelatedField(
+    clinic = PrefetchedPrimaryKeyRelatedField(
         queryset=Clinic.objects.filter(is_deleted=False),
     )
+    version = serializers.IntegerField(required=False, min_value=1)
 
     class Meta:
         model = Consultation
-        fields = ["start_time", "end_time", "status", "doctor", "patient", "clinic"]
+        fields = [
+            "start_time",
+            "end_time",
+            "status",
+            "doctor",
+            "patient",
+            "clinic",
+            "version",
+        ]
+        # unique_doctor_time проверяется в check_schedule() вместе с пересечениями
+        validators = []
+
+    def run_validation(self, data=empty):
+        # пересечения ищем на primary: реплика может не знать о свежих записях
+        with use_primary():
+            return super().run_validation(data)
 
     def validate(self, attrs):
-        start_time = attrs.get("start_time")
-        end_time = attrs.get("end_time")
-        doctor = attrs.get("doctor")
-        clinic = attrs.get("clinic")
+        # при частичном обновлении недостающие поля берём из instance, чтобы
+        # save(validated=True) не пропустил ни одной проверки
+        current = {
+            field: getattr(self.instance, field, None)
+            for field in ("start_time", "end_time", "doctor", "clinic")
+        }
+        current.update(attrs)
+        start_time = current["start_time"]
+        end_time = current["end_time"]
+        doctor = current["doctor"]
+        clinic = current["clinic"]
         if start_time and end_time:
             if start_time >= end_time:
                 raise serializers.ValidationError(
                     "Консультация не может закончиться раньше, чем начаться"
                 )
-            if start_time < timezone.now():
+            if "start_time" in attrs and start_time < timezone.now():
                 raise serializers.ValidationError(
                     {"start_time": "Начало консультации не может быть в прошлом"}
                 )
-        if doctor and start_time and end_time:
-            overlapping = Consultation.objects.filter(
+        if doctor and clinic and start_time and end_time:
+            schedule = Consultation(
+                pk=self.instance.pk if self.instance else None,
+                start_time=start_time,
+                end_time=end_time,
                 doctor=doctor,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-                is_deleted=False,
-            )
-            if self.instance:
-                overlapping = overlapping.exclude(pk=self.instance.pk)
-
-            if overlapping.exists():
+                clinic=clinic,
+            ).check_schedule()
+            if schedule["overlaps"] or schedule["slot_taken"]:
                 raise serializers.ValidationError(
                     {"start_time": "У врача уже назначена консультация в это время"}
                 )
-        if clinic and doctor:
-            if not doctor.clinics.filter(id=clinic.id).exists():
-                raise serializers.ValidationError({
-                    "doctor": "Доктор не работает в этой клинике"
-                })
+            if not schedule["works_in_clinic"]:
+                raise serializers.ValidationError(
+                    {"doctor": "Доктор не работает в этой клинике"}
+                )
         return attrs
+
+    def create(self, validated_data):
+        validated_data.pop("version", None)
+        instance = Consultation(**validated_data)
+        instance.save(validated=True)
+        return instance
+
+    def update(self, instance, validated_data):
+        # версия из запроса (или If-Match), иначе та, что была прочитана
+        expected_version = validated_data.pop(
+            "version", self.context.get("expected_version", instance.version)
+        )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if not instance.save_versioned(expected_version, validated_data.keys()):
+            raise VersionConflict()
+        return instance
+
+
+class ConsultationSyncSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Consultation
+        fields = [
+            "id",
+            "created_at",
+            "updated_at",
+            "start_time",
+            "end_time",
+            "status",
+            "doctor",
+            "patient",
+            "clinic",
+            "version",
+        ]
+        read_only_fields = fields
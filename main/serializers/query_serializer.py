@@ -0,0 +1,63 @@
+import base64
+import datetime
+from uuid import UUID
+
+from rest_framework import serializers
+
+from main.models import Consultation
+from main.serializers.audit_serializer import DateTimeRangeSerializer
+
+
+class LimitField(serializers.IntegerField):
+    # размер страницы зажимается в [1, maximum]: limit=0 или отрицательный
+    # не должен давать пустую страницу с has_more=true
+    def __init__(self, *, maximum: int, **kwargs):
+        self.maximum = maximum
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return min(max(super().to_internal_value(data), 1), self.maximum)
+
+
+def encode_cursor(value: datetime.datetime, pk: UUID) -> str:
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+class CursorField(serializers.CharField):
+    # курсор keyset-пагинации по паре (время, id) из encode_cursor
+    default_error_messages = {"invalid": "Некорректный курсор"}
+
+    def to_internal_value(self, data) -> tuple[datetime.datetime, UUID]:
+        token = super().to_internal_value(data)
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            value, pk = raw.split("|")
+            return datetime.datetime.fromisoformat(value), UUID(pk)
+        except ValueError:
+            self.fail("invalid")
+
+
+class DoctorListQuerySerializer(serializers.Serializer):
+    after = serializers.UUIDField(required=False)
+    limit = LimitField(maximum=200, default=50)
+
+
+class ConsultationListQuerySerializer(serializers.Serializer):
+    doctor = serializers.UUIDField(required=False)
+    patient = serializers.UUIDField(required=False)
+    clinic = serializers.UUIDField(required=False)
+    status = serializers.ChoiceField(
+        choices=Consultation.Status.choices, required=False
+    )
+    after = CursorField(required=False)
+    limit = LimitField(maximum=200, default=50)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    since = serializers.CharField(required=False)
+    limit = LimitField(maximum=1000, default=500)
+
+
+class AuditHistoryQuerySerializer(DateTimeRangeSerializer):
+    limit = LimitField(maximum=1000, default=100)
@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from main.broadcast import publish_consultation_event
+from main.jobs import enqueue
+from main import audit
+from main.models import (
+    AuditEntry,
+    Clinic,
+    Consultation,
+    Doctor,
+    DoctorEducation,
+    Patient,
+)
+
+
+def _schedule_profile_refresh(doctor_ids) -> None:
+    doctor_ids = sorted({str(doctor_id) for doctor_id in doctor_ids if doctor_id})
+    if doctor_ids:
+        enqueue("refresh_doctor_profiles", {"doctor_ids": doctor_ids})
+
+
+def _touch_clinics(clinic_ids) -> None:
+    # лента синхронизации clinics вкладывает врачей: смена состава или данных
+    # врача должна обновить строку клиники, чтобы триггер сдвинул её sync_seq
+    Clinic.all_objects.filter(pk__in=clinic_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, created, **kwargs):
+    _schedule_profile_refresh([instance.pk])
+    if not created:
+        _touch_clinics(instance.clinics.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=DoctorEducation)
+@receiver(post_delete, sender=DoctorEducation)
+def doctor_education_changed(sender, instance, **kwargs):
+    # при переносе к другому врачу прежний тоже перестаёт её показывать
+    loaded_doctor_id = getattr(instance, "_loaded_values", {}).get("doctor_id")
+    _schedule_profile_refresh([instance.doctor_id, loaded_doctor_id])
+    instance._loaded_values = {
+        **getattr(instance, "_loaded_values", {}),
+        "doctor_id": instance.doctor_id,
+    }
+
+
+@receiver(post_save, sender=Clinic)
+def clinic_saved(sender, instance, created, **kwargs):
+    if not created:
+        _schedule_profile_refresh(instance.doctors.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Clinic)
+def clinic_deleted(sender, instance, **kwargs):
+    # состав читается до каскадного удаления связей; обновление профилей
+    # выполнится после коммита, когда клиники уже нет
+    _schedule_profile_refresh(instance.doctors.values_list("id", flat=True))
+
+
+@receiver(m2m_changed, sender=Clinic.doctors.through)
+def clinic_doctors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_doctor_ids = [instance.pk]
+            instance._cleared_clinic_ids = list(
+                instance.clinics.values_list("id", flat=True)
+            )
+        else:
+            instance._cleared_doctor_ids = list(
+                instance.doctors.values_list("id", flat=True)
+            )
+            instance._cleared_clinic_ids = [instance.pk]
+        return
+    if action == "post_clear":
+        _schedule_profile_refresh(getattr(instance, "_cleared_doctor_ids", []))
+        _touch_clinics(getattr(instance, "_cleared_clinic_ids", []))
+        return
+    if action in ("post_add", "post_remove"):
+        _schedule_profile_refresh([instance.pk] if reverse else pk_set or [])
+        _touch_clinics(pk_set or [] if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Consultation)
+def consultation_saved(sender, instance, created, **kwargs):
+    # _loaded_values ещё до сохранения: audited_saved обновляет их последним
+    loaded_status = getattr(instance, "_loaded_values", {}).get("status")
+    if created:
+        event_type = "consultation.created"
+    elif instance.status != loaded_status:
+        event_type = "consultation.status_changed"
+    else:
+        event_type = "consultation.updated"
+    # запись уже зафиксирована: сбой доставки (например, NOTIFY на упавшем
+    # соединении) не должен превращать успешный запрос в 500
+    transaction.on_commit(
+        lambda: publish_consultation_event(instance, event_type), robust=True
+    )
+
+
+@receiver(post_save, sender=Consultation)
+@receiver(post_save, sender=Patient)
+def audited_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    after = audit.snapshot(instance)
+    changes = audit.diff({} if created else audit.loaded_snapshot(instance), after)
+    instance._loaded_values = {**getattr(instance, "_loaded_values", {}), **after}
+    if created:
+        action = AuditEntry.Action.CREATE
+    elif "is_deleted" in changes:
+        action = (
+            AuditEntry.Action.SOFT_DELETE
+            if instance.is_deleted
+            else AuditEntry.Action.RESTORE
+        )
+    elif changes:
+        action = AuditEntry.Action.UPDATE
+    else:
+        return
+    audit.capture(instance, action, changes)
+
+
+@receiver(post_delete, sender=Consultation)
+@receiver(post_delete, sender=Patient)
+def audited_deleted(sender, instance, **kwargs):
+    audit.capture(instance, AuditEntry.Action.DELETE, {})
@@ -0,0 +1,92 @@
+import base64
+import datetime
+from typing import Any
+from uuid import UUID
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers
+
+from main.instrumentation import serializer_timer
+from main.models import Clinic, Consultation, Doctor, Patient
+from main.serializers.clinic_serializer import ClinicSerializer
+from main.serializers.consult_serializer import ConsultationSyncSerializer
+from main.serializers.doctor_serializer import DoctorSerializer
+from main.serializers.patient_serializer import PatientSerializer
+
+FEEDS = {
+    "patients": (Patient, PatientSerializer, ()),
+    "doctors": (Doctor, DoctorSerializer, ()),
+    "clinics": (Clinic, ClinicSerializer, ("doctors",)),
+    "consultations": (Consultation, ConsultationSyncSerializer, ()),
+}
+
+
+def encode_watermark(sync_seq: int, pk: UUID) -> str:
+    raw = f"{sync_seq}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_watermark(token: str) -> tuple[int, UUID] | None:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        sync_seq, pk = raw.split("|")
+        pk = UUID(pk)
+        if not sync_seq.isdigit():
+            # метка прежнего формата (по updated_at) не сопоставима с
+            # sync_seq: клиент синхронизируется заново с начала ленты
+            datetime.datetime.fromisoformat(sync_seq)
+            return None
+        return int(sync_seq), pk
+    except ValueError:
+        raise serializers.ValidationError({"since": "Некорректная метка синхронизации"})
+
+
+def _committed(queryset: QuerySet) -> QuerySet:
+    # Метка идёт по sync_seq (см. миграцию 0013), а не по updated_at: время
+    # ставится при сохранении, и долгая транзакция коммитила бы строки ниже
+    # уже выданной метки. В PostgreSQL sync_seq — xid транзакции, и строки
+    # ещё идущих транзакций (xid >= xmin снимка) придерживаются до их конца;
+    # в SQLite пишущие транзакции выполняются по одной
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset
+    return queryset.filter(
+        sync_seq__lt=RawSQL("pg_snapshot_xmin(pg_current_snapshot())::text::bigint", [])
+    )
+
+
+def changes_since(feed: str, token: str | None, limit: int) -> dict[str, Any]:
+    model, serializer_class, prefetch = FEEDS[feed]
+    queryset = _committed(model.all_objects.all())
+    watermark = decode_watermark(token) if token else None
+    if watermark is not None:
+        sync_seq, pk = watermark
+        queryset = queryset.filter(
+            Q(sync_seq__gt=sync_seq) | Q(sync_seq=sync_seq, id__gt=pk)
+        )
+    rows = list(
+        queryset.prefetch_related(*prefetch).order_by("sync_seq", "id")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    live = [row for row in rows if not row.is_deleted]
+    with serializer_timer():
+        data = iter(serializer_class(live, many=True).data)
+    changes = [
+        (
+            {"id": row.id, "is_deleted": True, "updated_at": row.updated_at}
+            if row.is_deleted
+            else next(data)
+        )
+        for row in rows
+    ]
+    return {
+        "changes": changes,
+        "next": (
+            encode_watermark(rows[-1].sync_seq, rows[-1].id)
+            if rows
+            else token if watermark is not None else None
+        ),
+        "has_more": has_more,
+    }
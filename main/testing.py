@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from main.instrumentation import RequestMetrics
+
+
+def assert_within_query_budget(response, budget: int | None = None) -> None:
+    metrics: RequestMetrics = getattr(response, "request_metrics", None)
+    if metrics is None:
+        raise AssertionError("Ответ не прошёл через InstrumentationMiddleware")
+    budget = budget if budget is not None else response.query_budget
+    if budget is None:
+        raise AssertionError(f"Для {metrics.view} не объявлен query_budget")
+    if metrics.query_count > budget:
+        duplicates = "\n".join(
+            f"  x{count}: {sql}"
+            for sql, count in metrics.signatures.most_common()
+            if count > 1
+        )
+        raise AssertionError(
+            f"{metrics.view}: {metrics.query_count} запросов при бюджете {budget}"
+            + (f"\nПовторяющиеся запросы:\n{duplicates}" if duplicates else "")
+        )
+
+
+@contextmanager
+def query_budget_context(budget: int, using: str = "default"):
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > budget:
+        queries = "\n".join(f"  {query['sql']}" for query in context.captured_queries)
+        raise AssertionError(
+            f"{len(context)} запросов при бюджете {budget}:\n{queries}"
+        )
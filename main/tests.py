@@ -1,3 +1,1174 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import runpy
+import uuid
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from main import batch, db_router, ids
+from main.broadcast import Broadcaster
+from main.db_router import ReplicaRouter, use_primary
+from main.exceptions import VersionConflict
+from main.idempotency import _fingerprint
+from main.instrumentation import (
+    database_pool_stats,
+    registry,
+    render_pool_prometheus,
+)
+from main.jobs import (
+    claim,
+    enqueue,
+    job_stats,
+    purge_finished,
+    requeue_stale,
+    run,
+    task,
+)
+from main.management.commands.profile_startup import (
+    AUTHENTICATED_PATHS,
+    PUBLIC_PATHS,
+)
+from main.models import (
+    AuditEntry,
+    Clinic,
+    Consultation,
+    Doctor,
+    DoctorEducation,
+    DoctorProfile,
+    IdempotencyKey,
+    Job,
+    Patient,
+)
+from main.profiles import refresh_doctor_profiles
+from main.serializers.clinic_serializer import ClinicSerializer
+from main.serializers.consult_serializer import ConsultationWriteSerializer
+from main.serializers.query_serializer import encode_cursor
+from main.sync import FEEDS
+from main.testing import assert_within_query_budget, query_budget_context
+from main.warmup import measure_startup, on_startup, warm_requests
+
+PASSWORD = "Secret123!"
+
+
+def make_doctor(index: int = 0, **kwargs) -> Doctor:
+    fields = {
+        "first_name": "Иван",
+        "last_name": "Иванов",
+        "date_birth": datetime.date(1980, 1, 1),
+        "sex": "male",
+        "password": PASSWORD,
+        "email": f"doctor{index}@example.com",
+        "phone_number": f"+7900000{index:04d}",
+        "specialization": "Терапевт",
+        "date_start_work": datetime.date(2010, 1, 1),
+    }
+    fields.update(kwargs)
+    doctor = Doctor(**fields)
+    doctor.save()
+    return doctor
+
+
+def make_patient(index: int = 0, **kwargs) -> Patient:
+    fields = {
+        "first_name": "Олег",
+        "last_name": "Петров",
+        "date_birth": datetime.date(1990, 1, 1),
+        "sex": "male",
+        "password": PASSWORD,
+        "email": f"patient{index}@example.com",
+        "phone_number": f"+7910000{index:04d}",
+    }
+    fields.update(kwargs)
+    patient = Patient(**fields)
+    patient.save()
+    return patient
+
+
+# общая точка отсчёта: одинаковый slot() в разных вызовах даёт одно время
+SLOT_BASE = (timezone.now() + datetime.timedelta(days=1)).replace(
+    minute=0, second=0, microsecond=0
+)
+
+
+def slot(hours: int) -> tuple[datetime.datetime, datetime.datetime]:
+    start = SLOT_BASE + datetime.timedelta(hours=hours)
+    return start, start + datetime.timedelta(minutes=30)
+
+
+class ClinicDataMixin:
+    @classmethod
+    def create_clinic_data(cls):
+        cls.user = User.objects.create_user("staff", password=PASSWORD)
+        cls.clinic = Clinic.objects.create(
+            name="Клиника", registered_adress="ул. 1", actual_adress="ул. 2"
+        )
+        cls.doctor = make_doctor()
+        cls.clinic.doctors.add(cls.doctor)
+        cls.patient = make_patient()
+
+    def make_consultation(self, hours: int = 0, **kwargs) -> Consultation:
+        start_time, end_time = slot(hours)
+        fields = {
+            "start_time": start_time,
+            "end_time": end_time,
+            "doctor": self.doctor,
+            "patient": self.patient,
+            "clinic": self.clinic,
+        }
+        fields.update(kwargs)
+        consultation = Consultation(**fields)
+        consultation.save()
+        return consultation
+
+    def booking(self, hours: int = 0) -> dict:
+        start_time, end_time = slot(hours)
+        return {
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "status": "confirmed",
+            "doctor": str(self.doctor.pk),
+            "patient": str(self.patient.pk),
+            "clinic": str(self.clinic.pk),
+        }
+
+    def post(self, path: str, data, **headers):
+        return self.client.post(
+            path, json.dumps(data), content_type="application/json", headers=headers
+        )
+
+    def patch(self, path: str, data, **headers):
+        return self.client.patch(
+            path, json.dumps(data), content_type="application/json", headers=headers
+        )
+
+
+class ClinicDataTestCase(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_clinic_data()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+
+class GenerateDataTests(TestCase):
+    def generate(self):
+        call_command(
+            "generate_data",
+            clinics=2,
+            doctors=3,
+            patients=5,
+            consultations=10,
+            stdout=StringIO(),
+        )
+
+    def test_second_run_does_not_collide(self):
+        self.generate()
+        self.generate()
+        self.assertEqual(Doctor.objects.count(), 6)
+        self.assertEqual(Patient.objects.count(), 10)
+        self.assertEqual(Consultation.objects.count(), 20)
+
+
+class ConsultationListTests(ClinicDataTestCase):
+    def test_invalid_query_params_are_rejected(self):
+        for query in ("limit=abc", "doctor=xyz", "status=unknown", "after=xyz"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/consultations/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_limit_is_clamped(self):
+        self.make_consultation(0)
+        self.make_consultation(1)
+        response = self.client.get("/api/consultations/?limit=-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1)
+        response = self.client.get(f"/api/consultations/?doctor={self.doctor.pk}")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_pages_follow_cursor(self):
+        # две записи с одним start_time: порядок добивается id
+        created = [self.make_consultation(hours) for hours in (0, 1, 2)]
+        other = make_doctor(1)
+        self.clinic.doctors.add(other)
+        created.append(self.make_consultation(1, doctor=other))
+        seen, after = [], None
+        while True:
+            query = "limit=1" + (f"&after={after}" if after else "")
+            page = self.client.get(f"/api/consultations/?{query}").json()
+            seen += [row["id"] for row in page["results"]]
+            after = page["next"]
+            if after is None:
+                break
+        expected = sorted(created, key=lambda row: (row.start_time, row.id))
+        self.assertEqual(seen, [str(row.id) for row in expected])
+
+
+class IdempotencyTests(ClinicDataTestCase):
+    def test_replay_returns_stored_response(self):
+        # одно тело на оба запроса: slot() зависит от текущего времени
+        booking = self.booking()
+        first = self.post("/api/consultations/", booking, **{"Idempotency-Key": "k1"})
+        self.assertEqual(first.status_code, 201)
+        second = self.post("/api/consultations/", booking, **{"Idempotency-Key": "k1"})
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(Consultation.objects.count(), 1)
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        self.post("/api/consultations/", self.booking(0), **{"Idempotency-Key": "k2"})
+        response = self.post(
+            "/api/consultations/", self.booking(1), **{"Idempotency-Key": "k2"}
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_keys_are_scoped_by_user(self):
+        first = self.post(
+            "/api/consultations/", self.booking(0), **{"Idempotency-Key": "k4"}
+        )
+        self.client.force_login(User.objects.create_user("other"))
+        second = self.post(
+            "/api/consultations/", self.booking(1), **{"Idempotency-Key": "k4"}
+        )
+        self.assertEqual(second.status_code, 201)
+        self.assertFalse(second.has_header("Idempotent-Replayed"))
+        self.assertNotEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(IdempotencyKey.objects.filter(key="k4").count(), 2)
+
+    def test_request_in_flight_returns_conflict(self):
+        booking = self.booking()
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="k3",
+            endpoint="/api/consultations/",
+            fingerprint=_fingerprint(SimpleNamespace(method="POST", data=booking)),
+            expires_at=timezone.now() + datetime.timedelta(hours=1),
+        )
+        response = self.post(
+            "/api/consultations/", booking, **{"Idempotency-Key": "k3"}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Consultation.objects.exists())
+
+
+class ScheduleValidationTests(ClinicDataTestCase):
+    def test_booking_validates_and_saves_in_five_queries(self):
+        # врач, пациент, клиника, check_schedule() и INSERT
+        with query_budget_context(5):
+            serializer = ConsultationWriteSerializer(data=self.booking())
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            serializer.save()
+
+    def test_soft_deleted_consultation_keeps_its_slot(self):
+        deleted = self.make_consultation()
+        deleted.is_deleted = True
+        deleted.save()
+        start_time, end_time = slot(0)
+        schedule = Consultation(
+            start_time=start_time,
+            end_time=end_time,
+            doctor=self.doctor,
+            clinic=self.clinic,
+        ).check_schedule()
+        self.assertEqual(
+            schedule, {"overlaps": False, "slot_taken": True, "works_in_clinic": True}
+        )
+        serializer = ConsultationWriteSerializer(data=self.booking())
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("start_time", serializer.errors)
+
+    def test_direct_save_rejects_overlap(self):
+        self.make_consultation()
+        start_time, end_time = slot(0)
+        shift = datetime.timedelta(minutes=15)
+        with self.assertRaises(ValidationError):
+            self.make_consultation(
+                start_time=start_time + shift, end_time=end_time + shift
+            )
+        self.assertEqual(Consultation.objects.count(), 1)
+
+
+class VersionedUpdateTests(ClinicDataTestCase):
+    def test_stale_if_match_is_rejected(self):
+        consultation = self.make_consultation()
+        path = f"/api/consultations/{consultation.pk}/"
+        response = self.patch(path, {"status": "started"}, **{"If-Match": '"1"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"2"')
+        response = self.patch(path, {"status": "completed"}, **{"If-Match": '"1"'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_plain_save_bumps_version(self):
+        consultation = self.make_consultation()
+        consultation.is_deleted = True
+        consultation.save()
+        self.assertEqual(Consultation.all_objects.get(pk=consultation.pk).version, 2)
+        consultation.is_deleted = False
+        consultation.save(update_fields=["is_deleted"])
+        self.assertEqual(Consultation.all_objects.get(pk=consultation.pk).version, 3)
+        response = self.patch(
+            f"/api/consultations/{consultation.pk}/",
+            {"status": "started"},
+            **{"If-Match": '"1"'},
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_plain_save_does_not_overwrite_newer_version(self):
+        consultation = self.make_consultation()
+        stale = Consultation.objects.get(pk=consultation.pk)
+        response = self.patch(
+            f"/api/consultations/{consultation.pk}/", {"status": "started"}
+        )
+        self.assertEqual(response.status_code, 200)
+        stale.status = Consultation.Status.COMPLETED
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            stale.save()
+        self.assertEqual(stale.version, 1)
+        consultation.refresh_from_db()
+        self.assertEqual(consultation.status, Consultation.Status.STARTED)
+        self.assertEqual(consultation.version, 2)
+
+    def test_admin_edit_of_stale_form_is_rejected(self):
+        consultation = self.make_consultation()
+        self.client.force_login(User.objects.create_superuser("root"))
+        self.patch(f"/api/consultations/{consultation.pk}/", {"status": "started"})
+        start_time = timezone.localtime(consultation.start_time)
+        end_time = timezone.localtime(consultation.end_time)
+        response = self.client.post(
+            f"/admin/main/consultation/{consultation.pk}/change/",
+            {
+                "start_time_0": start_time.date().isoformat(),
+                "start_time_1": start_time.time().isoformat(),
+                "end_time_0": end_time.date().isoformat(),
+                "end_time_1": end_time.time().isoformat(),
+                "status": "completed",
+                "doctor": self.doctor.pk,
+                "patient": self.patient.pk,
+                "clinic": self.clinic.pk,
+                "loaded_version": 1,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, VersionConflict.default_detail)
+        consultation.refresh_from_db()
+        self.assertEqual(consultation.status, Consultation.Status.STARTED)
+
+
+class BroadcastTests(ClinicDataTestCase):
+    def test_local_backend_fans_out_by_channel(self):
+        hub = Broadcaster("main.broadcast.LocalBackend")
+
+        async def scenario():
+            doctor = hub.subscribe(["doctor:1"])
+            clinic = hub.subscribe(["clinic:1", "clinic:2"])
+            async with doctor, clinic:
+                hub.publish(["doctor:1", "clinic:2"], {"type": "first"})
+                hub.publish(["clinic:1"], {"type": "second"})
+                await asyncio.sleep(0)
+                received = (
+                    [doctor.queue.get_nowait() for _ in range(doctor.queue.qsize())],
+                    [clinic.queue.get_nowait() for _ in range(clinic.queue.qsize())],
+                )
+            return received, dict(hub._subscribers)
+
+        (doctor_events, clinic_events), subscribers = asyncio.run(scenario())
+        self.assertEqual(doctor_events, [{"type": "first"}])
+        self.assertEqual(clinic_events, [{"type": "first"}, {"type": "second"}])
+        self.assertEqual(subscribers, {})
+
+    def test_full_queue_drops_events(self):
+        hub = Broadcaster("main.broadcast.LocalBackend")
+
+        async def scenario():
+            async with hub.subscribe(["doctor:1"]) as subscription:
+                subscription.queue = asyncio.Queue(maxsize=2)
+                for index in range(3):
+                    hub.publish(["doctor:1"], {"type": "event", "index": index})
+                await asyncio.sleep(0)
+                return [
+                    subscription.queue.get_nowait()["index"]
+                    for _ in range(subscription.queue.qsize())
+                ]
+
+        self.assertEqual(asyncio.run(scenario()), [0, 1])
+
+    def published(self, action) -> list[tuple[str, int]]:
+        with mock.patch("main.signals.publish_consultation_event") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+        return [
+            (event_type, consultation.version)
+            for (consultation, event_type), _ in publish.call_args_list
+        ]
+
+    def test_consultation_events(self):
+        response = None
+
+        def create():
+            nonlocal response
+            response = self.post("/api/consultations/", self.booking())
+
+        self.assertEqual(self.published(create), [("consultation.created", 1)])
+        path = f"/api/consultations/{response.json()['id']}/"
+        _, end_time = slot(0)
+        end_time += datetime.timedelta(minutes=15)
+        self.assertEqual(
+            self.published(
+                lambda: self.patch(path, {"end_time": end_time.isoformat()})
+            ),
+            [("consultation.updated", 2)],
+        )
+        self.assertEqual(
+            self.published(lambda: self.patch(path, {"status": "started"})),
+            [("consultation.status_changed", 3)],
+        )
+
+    def test_publish_failure_does_not_fail_request(self):
+        consultation = self.make_consultation()
+        with (
+            mock.patch(
+                "main.signals.publish_consultation_event",
+                side_effect=DatabaseError("connection lost"),
+            ),
+            self.assertLogs("django", "ERROR"),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            response = self.patch(
+                f"/api/consultations/{consultation.pk}/", {"status": "started"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class UUID7Tests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(ids, _last_ms=0, _counter=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, ms: int, count: int = 1) -> list[uuid.UUID]:
+        with mock.patch("main.ids.time.time_ns", return_value=ms * 1_000_000):
+            return [ids.uuid7() for _ in range(count)]
+
+    def test_version_variant_and_timestamp(self):
+        (value,) = self.generate(1_700_000_000_123)
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertEqual(value.int >> 80, 1_700_000_000_123)
+
+    def test_monotonic_within_and_across_milliseconds(self):
+        values = self.generate(1_000, 50) + self.generate(1_001, 50)
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), 100)
+        # часы отстали: идентификаторы всё равно растут
+        values += self.generate(900, 10)
+        self.assertEqual(values, sorted(values))
+
+    def test_counter_overflow_borrows_next_millisecond(self):
+        values = self.generate(1_000, 0x1001)
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(values[-1].int >> 80, 1_001)
+        # следующая реальная миллисекунда не откатывает время назад
+        later = self.generate(1_001, 1)[0]
+        self.assertGreater(later, values[-1])
+
+    def test_models_use_uuid7(self):
+        for model in (Patient, Doctor, Clinic, Consultation):
+            with self.subTest(model=model.__name__):
+                self.assertIs(model._meta.pk.default, ids.uuid7)
+                self.assertEqual(model().pk.version, 7)
+
+
+class SyncFeedTests(ClinicDataTestCase):
+    def changes(self, feed: str, since: str | None = None, limit: int = 500):
+        query = f"?limit={limit}" + (f"&since={since}" if since else "")
+        response = self.client.get(f"/api/sync/{feed}/{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_watermark(self):
+        make_patient(1)
+        make_patient(2)
+        seen, since = [], None
+        while True:
+            page = self.changes("patients", since, limit=1)
+            seen += [row["id"] for row in page["changes"]]
+            since = page["next"]
+            if not page["has_more"]:
+                break
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(len(set(seen)), 3)
+        self.assertEqual(self.changes("patients", since)["changes"], [])
+
+    def test_non_positive_limit_still_advances(self):
+        make_patient(1)
+        page = self.changes("patients", limit=0)
+        self.assertEqual(len(page["changes"]), 1)
+        self.assertTrue(page["has_more"])
+        self.assertEqual(
+            self.client.get("/api/sync/patients/?limit=x").status_code, 400
+        )
+
+    def test_late_commit_with_older_timestamp_is_synced(self):
+        since = self.changes("patients")["next"]
+        # транзакция начата давно и коммитится уже после выданной метки
+        late = make_patient(1)
+        Patient.all_objects.filter(pk=late.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        page = self.changes("patients", since)
+        self.assertEqual([row["id"] for row in page["changes"]], [str(late.pk)])
+
+    def test_every_update_moves_the_row_forward(self):
+        since = self.changes("patients")["next"]
+        Patient.all_objects.filter(pk=self.patient.pk).update(first_name="Пётр")
+        changes = self.changes("patients", since)["changes"]
+        self.assertEqual([row["first_name"] for row in changes], ["Пётр"])
+
+    def test_legacy_watermark_restarts_the_feed(self):
+        legacy = encode_cursor(timezone.now(), self.patient.pk)
+        page = self.changes("patients", legacy)
+        self.assertEqual(len(page["changes"]), 1)
+        self.assertNotEqual(page["next"], legacy)
+
+    def test_clinic_membership_change_is_synced(self):
+        since = self.changes("clinics")["next"]
+        other = make_doctor(1)
+        self.clinic.doctors.add(other)
+        changes = self.changes("clinics", since)["changes"]
+        self.assertEqual([row["id"] for row in changes], [str(self.clinic.pk)])
+        self.assertEqual(len(changes[0]["doctors"]), 2)
+        since = self.changes("clinics")["next"]
+        other.clinics.clear()
+        changes = self.changes("clinics", since)["changes"]
+        self.assertEqual(len(changes[0]["doctors"]), 1)
+
+
+class PersonAdminTests(ClinicDataTestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("root", password=PASSWORD)
+        self.client.force_login(admin)
+
+    def form(self, index: int, **kwargs) -> dict:
+        data = {
+            "first_name": "Анна",
+            "last_name": "Смирнова",
+            "date_birth": "1995-05-05",
+            "sex": "female",
+            "email": f"admin-form{index}@example.com",
+            "phone_number": f"+7920000{index:04d}",
+        }
+        data.update(kwargs)
+        return data
+
+    def test_add_hashes_password(self):
+        response = self.client.post(
+            "/admin/main/patient/add/", self.form(1, new_password=PASSWORD)
+        )
+        self.assertEqual(response.status_code, 302)
+        patient = Patient.objects.get(email="admin-form1@example.com")
+        self.assertTrue(check_password(PASSWORD, patient.password))
+
+    def test_add_requires_password(self):
+        response = self.client.post("/admin/main/patient/add/", self.form(2))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Patient.objects.filter(email="admin-form2@example.com"))
+
+    def test_change_keeps_password(self):
+        password = self.patient.password
+        data = self.form(
+            3, email=self.patient.email, phone_number=self.patient.phone_number
+        )
+        response = self.client.post(
+            f"/admin/main/patient/{self.patient.pk}/change/", data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.first_name, "Анна")
+        self.assertEqual(self.patient.password, password)
+
+
+class BatchTests(ClinicDataTestCase):
+    def person(self, index: int, **kwargs) -> dict:
+        data = {
+            "first_name": "Анна",
+            "last_name": "Смирнова",
+            "date_birth": "1995-05-05",
+            "sex": "female",
+            "password": PASSWORD,
+            "email": f"batch{index}@example.com",
+            "phone_number": f"+7930000{index:04d}",
+        }
+        data.update(kwargs)
+        return data
+
+    def batch(self, operations: list[dict], atomic: bool = True):
+        response = self.post(
+            "/api/batch/", {"operations": operations, "atomic": atomic}
+        )
+        return response.status_code, [
+            result["status"] for result in response.json()["results"]
+        ]
+
+    def test_references_to_created_records(self):
+        booking = self.booking()
+        booking["patient"] = "$p1"
+        code, statuses = self.batch(
+            [
+                {
+                    "id": "p1",
+                    "method": "create",
+                    "resource": "patients",
+                    "data": self.person(1),
+                },
+                {"method": "create", "resource": "consultations", "data": booking},
+            ]
+        )
+        self.assertEqual((code, statuses), (200, [201, 201]))
+        patient = Patient.objects.get(email="batch1@example.com")
+        self.assertTrue(Consultation.objects.filter(patient=patient).exists())
+
+    def test_atomic_batch_is_rolled_back(self):
+        code, statuses = self.batch(
+            [
+                {"method": "create", "resource": "patients", "data": self.person(1)},
+                {
+                    "method": "create",
+                    "resource": "patients",
+                    "data": self.person(2, email="invalid"),
+                },
+                {"method": "create", "resource": "patients", "data": self.person(3)},
+            ]
+        )
+        self.assertEqual((code, statuses), (207, [201, 400, 424]))
+        self.assertFalse(Patient.objects.filter(email__startswith="batch"))
+
+    def test_model_validation_error_fails_only_its_operation(self):
+        future = (timezone.now() + datetime.timedelta(days=30)).date().isoformat()
+        doctor = self.person(2, specialization="Хирург", date_start_work=future)
+        code, statuses = self.batch(
+            [
+                {"method": "create", "resource": "patients", "data": self.person(1)},
+                {"method": "create", "resource": "doctors", "data": doctor},
+            ],
+            atomic=False,
+        )
+        self.assertEqual((code, statuses), (207, [201, 400]))
+        self.assertTrue(Patient.objects.filter(email="batch1@example.com").exists())
+        self.assertFalse(Doctor.objects.filter(email="batch2@example.com").exists())
+
+    def test_integrity_error_fails_only_its_operation(self):
+        original = batch.build_context
+
+        def build_context(operations):
+            context = original(operations)
+            # параллельный запрос успел занять email после проверок пакета
+            make_patient(5, email="batch2@example.com")
+            return context
+
+        with mock.patch("main.batch.build_context", build_context):
+            code, statuses = self.batch(
+                [
+                    {
+                        "method": "create",
+                        "resource": "patients",
+                        "data": self.person(1),
+                    },
+                    {
+                        "method": "create",
+                        "resource": "patients",
+                        "data": self.person(2),
+                    },
+                ],
+                atomic=False,
+            )
+        self.assertEqual((code, statuses), (207, [201, 400]))
+        self.assertTrue(Patient.objects.filter(email="batch1@example.com").exists())
+
+
+@override_settings(
+    WARMUP_ON_STARTUP=True,
+    WARMUP_DATABASE=True,
+    WARMUP_PATHS=["/api/doctors/"],
+    WARMUP_MAX_SECONDS=60,
+)
+class WarmupTests(TransactionTestCase):
+    def test_startup_inside_event_loop(self):
+        # так asgi.py импортирует uvicorn
+        async def import_application():
+            on_startup()
+
+        registry.reset()
+        with self.assertNoLogs("main.warmup", "WARNING"):
+            asyncio.run(import_application())
+        self.assertNotIn('view="doctor-list"', registry.render_prometheus())
+
+    def test_measure_startup_logs_in_for_protected_paths(self):
+        User.objects.create_user("staff")
+        paths = PUBLIC_PATHS + AUTHENTICATED_PATHS
+        anonymous = measure_startup(paths, warmup=False)
+        self.assertEqual(
+            [request["status"] for request in anonymous["requests"]],
+            [200, 200, 403, 403, 403, 403],
+        )
+        report = measure_startup(paths, warmup=False, username="staff")
+        self.assertEqual({request["status"] for request in report["requests"]}, {200})
+
+    def test_warmup_requests_are_not_recorded(self):
+        registry.reset()
+        warm_requests()
+        self.client.get("/api/doctors/")
+        metrics = registry.render_prometheus()
+        self.assertIn('mis_view_requests_total{view="doctor-list"} 1', metrics)
+
+
+@override_settings(JOBS_RUN_INLINE=True)
+class DoctorProfileSignalTests(ClinicDataTestCase):
+    def profile(self, doctor: Doctor) -> dict:
+        return DoctorProfile.objects.get(doctor=doctor).document
+
+    def test_clinic_changes_reach_profiles(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clinic.name = "Новое имя"
+            self.clinic.save()
+        self.assertEqual(self.profile(self.doctor)["clinics"][0]["name"], "Новое имя")
+        other = Clinic.objects.create(
+            name="Вторая", registered_adress="-", actual_adress="-"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            other.doctors.add(self.doctor)
+        self.assertEqual(len(self.profile(self.doctor)["clinics"]), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        clinics = self.profile(self.doctor)["clinics"]
+        self.assertEqual([clinic["id"] for clinic in clinics], [str(self.clinic.pk)])
+
+    def test_moved_education_leaves_previous_doctor(self):
+        other = make_doctor(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            education = DoctorEducation.objects.create(
+                doctor=self.doctor, university="МГУ"
+            )
+        self.assertEqual(len(self.profile(self.doctor)["educations"]), 1)
+        education = DoctorEducation.objects.get(pk=education.pk)
+        education.doctor = other
+        with self.captureOnCommitCallbacks(execute=True):
+            education.save()
+        self.assertEqual(self.profile(self.doctor)["educations"], [])
+        self.assertEqual(len(self.profile(other)["educations"]), 1)
+
+
+@override_settings(DB_REPLICA_MAX_LAG=5)
+class DatabasePoolTests(SimpleTestCase):
+    def load_settings(self, **env) -> dict:
+        environ = {
+            key: value for key, value in os.environ.items() if not key.startswith("DB_")
+        }
+        with (
+            mock.patch.dict(os.environ, {**environ, **env}, clear=True),
+            mock.patch("dotenv.load_dotenv"),
+        ):
+            return runpy.run_path(
+                str(settings.BASE_DIR / "medical_information_system" / "settings.py")
+            )["DATABASES"]
+
+    def test_pool_options_from_environment(self):
+        databases = self.load_settings(
+            DB_POOL_MIN_SIZE="4",
+            DB_POOL_MAX_SIZE="20",
+            DB_POOL_TIMEOUT="2.5",
+            DB_POOL_MAX_IDLE="60",
+            DB_POOL_MAX_LIFETIME="1800",
+            DB_REPLICA_HOSTS="replica-a:5433",
+        )
+        pool = {
+            "min_size": 4,
+            "max_size": 20,
+            "timeout": 2.5,
+            "max_idle": 60.0,
+            "max_lifetime": 1800.0,
+        }
+        self.assertEqual(databases["default"]["OPTIONS"]["pool"], pool)
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 0)
+        self.assertEqual(databases["replica_0"]["OPTIONS"]["pool"], pool)
+        self.assertEqual(databases["replica_0"]["PORT"], "5433")
+
+    def test_pool_defaults_and_disabling(self):
+        self.assertEqual(
+            self.load_settings()["default"]["OPTIONS"]["pool"],
+            {
+                "min_size": 2,
+                "max_size": 10,
+                "timeout": 10.0,
+                "max_idle": 600.0,
+                "max_lifetime": 3600.0,
+            },
+        )
+        for value in ("false", "False", "0"):
+            with self.subTest(DB_POOL=value):
+                self.assertNotIn(
+                    "pool", self.load_settings(DB_POOL=value)["default"]["OPTIONS"]
+                )
+
+    def stub_pool(self, **stats):
+        pool = mock.Mock()
+        pool.get_stats.return_value = stats
+        patcher = mock.patch.object(
+            connections[DEFAULT_DB_ALIAS], "pool", pool, create=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stats_mapping(self):
+        self.stub_pool(
+            pool_min=2,
+            pool_max=10,
+            pool_size=6,
+            pool_available=2,
+            requests_waiting=3,
+            requests_num=40,
+            requests_queued=8,
+            requests_wait_ms=200,
+            requests_errors=1,
+            connections_lost=5,
+        )
+        self.assertEqual(
+            database_pool_stats(),
+            {
+                "default": {
+                    "min_size": 2,
+                    "max_size": 10,
+                    "size": 6,
+                    "available": 2,
+                    "in_use": 4,
+                    "waiting": 3,
+                    "requests": 40,
+                    "requests_queued": 8,
+                    "wait_ms_total": 200,
+                    "wait_ms_avg": 25.0,
+                    "timeouts": 1,
+                    "connections_lost": 5,
+                }
+            },
+        )
+        metrics = render_pool_prometheus()
+        self.assertIn("# TYPE mis_db_pool_in_use gauge", metrics)
+        self.assertIn('mis_db_pool_in_use{alias="default"} 4', metrics)
+        self.assertIn('mis_db_pool_wait_ms_total{alias="default"} 200', metrics)
+
+    def test_stats_of_fresh_pool(self):
+        # psycopg_pool не возвращает счётчики, которые ещё не менялись
+        self.stub_pool(pool_min=2, pool_max=10, pool_size=2, pool_available=2)
+        stats = database_pool_stats()["default"]
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["requests_queued"], 0)
+        self.assertEqual(stats["wait_ms_avg"], 0)
+
+    def test_no_pool_no_stats(self):
+        # без пула (SQLite, DB_POOL=false) пул в метриках не появляется
+        self.assertEqual(database_pool_stats(), {})
+        self.assertNotIn("alias=", render_pool_prometheus())
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        db_router._lag_cache.clear()
+        self.lag = {"replica_0": 0.0, "replica_1": 0.0}
+        # реплики без соединений: маршрутизатор видит только алиасы и
+        # отставание из _measure_lag
+        for name, stub in (
+            ("replica_aliases", lambda: list(self.lag)),
+            ("_measure_lag", self.lag.get),
+        ):
+            patcher = mock.patch(f"main.db_router.{name}", stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def request(self, read, method="GET", cookies=None):
+        # read(router) выполняется внутри PrimaryPinningMiddleware, как view
+        request = getattr(RequestFactory(), method.lower())("/")
+        request.COOKIES.update(cookies or {})
+        result = {}
+
+        def view(request):
+            result["value"] = read(ReplicaRouter())
+            return HttpResponse()
+
+        response = db_router.PrimaryPinningMiddleware(view)(request)
+        return result["value"], response
+
+    def test_lagging_replica_is_skipped(self):
+        self.lag.update(replica_0=30.0)
+        aliases, _ = self.request(
+            lambda router: {router.db_for_read(Doctor) for _ in range(20)}
+        )
+        self.assertEqual(aliases, {"replica_1"})
+        db_router._lag_cache.clear()
+        self.lag.update(replica_1=None)
+        alias, _ = self.request(lambda router: router.db_for_read(Doctor))
+        self.assertEqual(alias, db_router.PRIMARY)
+
+    def test_request_sticks_to_one_replica(self):
+        def read(router):
+            aliases = {router.db_for_read(model) for model in (Doctor, Patient) * 10}
+            db_router._lag_cache.clear()
+            self.lag.update(replica_0=30.0, replica_1=30.0)
+            # отставшая реплика меняется на primary, а не на соседнюю
+            return aliases, router.db_for_read(Doctor)
+
+        (aliases, after_lag), _ = self.request(read)
+        self.assertEqual(len(aliases), 1)
+        self.assertEqual(after_lag, db_router.PRIMARY)
+
+    def test_instance_hint_keeps_its_database(self):
+        doctor = Doctor()
+        doctor._state.db = "replica_1"
+        self.lag.update(replica_1=30.0)
+        alias, _ = self.request(
+            lambda router: router.db_for_read(Clinic, instance=doctor)
+        )
+        self.assertEqual(alias, "replica_1")
+
+    def test_writes_pin_reads_to_primary(self):
+        def read(router):
+            before = router.db_for_read(Doctor)
+            router.db_for_write(Doctor)
+            return before, router.db_for_read(Doctor)
+
+        (before, after), _ = self.request(read)
+        self.assertNotEqual(before, db_router.PRIMARY)
+        self.assertEqual(after, db_router.PRIMARY)
+
+    def test_pin_cookie(self):
+        alias, response = self.request(
+            lambda router: router.db_for_read(Doctor), method="POST"
+        )
+        self.assertEqual(alias, db_router.PRIMARY)
+        cookie = response.cookies[db_router.PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.DB_REPLICA_PIN_SECONDS)
+        alias, _ = self.request(
+            lambda router: router.db_for_read(Doctor),
+            cookies={db_router.PIN_COOKIE: "1"},
+        )
+        self.assertEqual(alias, db_router.PRIMARY)
+        alias, response = self.request(lambda router: router.db_for_read(Doctor))
+        self.assertNotEqual(alias, db_router.PRIMARY)
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_use_primary(self):
+        def read(router):
+            with use_primary():
+                inside = router.db_for_read(Doctor)
+            return inside, router.db_for_read(Doctor)
+
+        (inside, outside), _ = self.request(read)
+        self.assertEqual(inside, db_router.PRIMARY)
+        self.assertIn(outside, ("replica_0", "replica_1"))
+
+
+@task("tests.create_clinic")
+def create_clinic_task(name: str) -> None:
+    Clinic.objects.create(name=name, registered_adress="-", actual_adress="-")
+
+
+class JobQueueTests(TestCase):
+    def test_claimed_job_runs_once(self):
+        job = enqueue("tests.create_clinic", {"name": "A"})
+        [claimed] = claim("w1")
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claim("w2"), [])
+        self.assertTrue(run(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.Status.DONE)
+        self.assertEqual(Clinic.objects.filter(name="A").count(), 1)
+
+    def test_requeued_job_is_not_finished_by_old_owner(self):
+        enqueue("tests.create_clinic", {"name": "B"})
+        [stale] = claim("w1")
+        requeue_stale(timeout=-1)
+        [current] = claim("w2")
+        with self.assertLogs("main.jobs", "WARNING"):
+            self.assertFalse(run(stale))
+        self.assertEqual(Clinic.objects.filter(name="B").count(), 0)
+        current.refresh_from_db()
+        self.assertEqual(current.status, Job.Status.RUNNING)
+        self.assertEqual(current.locked_by, "w2")
+        self.assertTrue(run(current))
+        self.assertEqual(Clinic.objects.filter(name="B").count(), 1)
+
+    def test_requeue_stale_respects_max_attempts(self):
+        enqueue("tests.create_clinic", {"name": "C"}, max_attempts=1)
+        claim("w1")
+        self.assertEqual(requeue_stale(timeout=-1), 0)
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(claim("w2"), [])
+
+    def test_stats_and_purge(self):
+        enqueue("tests.create_clinic", {"name": "D"})
+        enqueue("tests.create_clinic", {"name": "E"}, queue="other")
+        for job in claim("w1"):
+            run(job)
+        self.assertEqual(
+            job_stats(),
+            {
+                "default": {"queued": 0, "running": 0, "failed": 0, "done_recently": 1},
+                "other": {"queued": 1, "running": 0, "failed": 0, "done_recently": 0},
+            },
+        )
+        self.assertEqual(purge_finished(datetime.timedelta(seconds=-1)), 1)
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class AuditTests(ClinicDataTestCase):
+    def test_rolled_back_savepoint_is_not_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                kept = make_patient(1)
+                try:
+                    with transaction.atomic():
+                        dropped = make_patient(2)
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+        entity_ids = set(AuditEntry.objects.values_list("entity_id", flat=True))
+        self.assertIn(kept.pk, entity_ids)
+        self.assertNotIn(dropped.pk, entity_ids)
+
+    def test_update_records_only_changed_fields(self):
+        patient = Patient.objects.get(pk=self.patient.pk)
+        patient.first_name = "Пётр"
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        entry = AuditEntry.objects.get(entity_id=patient.pk, action="update")
+        self.assertEqual(entry.changes, {"first_name": ["Олег", "Пётр"]})
+
+    def test_history_rejects_invalid_limit(self):
+        path = f"/api/audit/patient/{self.patient.pk}/"
+        self.assertEqual(self.client.get(f"{path}?limit=abc").status_code, 400)
+        self.assertEqual(self.client.get(f"{path}?limit=0").status_code, 200)
+
+
+class PermissionTests(ClinicDataTestCase):
+    def test_anonymous_access_is_limited_to_doctors(self):
+        self.client.logout()
+        for path in (
+            "/api/consultations/",
+            f"/api/audit/patient/{self.patient.pk}/",
+            "/api/sync/patients/",
+            "/api/patients/search/?q=О",
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 403)
+        self.assertEqual(self.client.get("/api/schedule/stream/").status_code, 401)
+        self.assertEqual(self.client.get("/api/doctors/").status_code, 200)
+        refresh_doctor_profiles([self.doctor.pk])
+        path = f"/api/doctors/{self.doctor.pk}/"
+        self.assertEqual(self.client.get(path).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_metrics_require_staff_or_token(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        response = self.client.get(
+            "/api/metrics/", headers={"Authorization": "Bearer wrong"}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            "/api/metrics/", headers={"Authorization": "Bearer scrape-token"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_login(User.objects.create_user("ops", is_staff=True))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 200)
+
+
+class QueryBudgetTests(ClinicDataMixin, TransactionTestCase):
+    # Без обёртки TestCase: запись аудита уходит в базу в рамках запроса
+    # и попадает в бюджет, как в автокоммите в продакшене
+
+    def setUp(self):
+        self.create_clinic_data()
+        # по несколько строк каждого вида, чтобы N+1 вышел за бюджет
+        other = Clinic.objects.create(
+            name="Вторая", registered_adress="ул. 3", actual_adress="ул. 4"
+        )
+        for index in (1, 2):
+            self.clinic.doctors.add(make_doctor(index))
+            other.doctors.add(make_doctor(index + 2))
+            make_patient(index)
+        for hours in range(3):
+            self.make_consultation(hours)
+        refresh_doctor_profiles([self.doctor.pk])
+        self.client.force_login(self.user)
+
+    def assert_get_within_budget(self, path: str) -> None:
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        assert_within_query_budget(response)
+
+    def test_read_endpoints(self):
+        consultation = Consultation.objects.first()
+        for path in (
+            "/api/doctors/",
+            f"/api/doctors/{self.doctor.pk}/",
+            "/api/patients/search/?q=Пет",
+            "/api/consultations/",
+            f"/api/consultations/?clinic={self.clinic.pk}",
+            f"/api/consultations/{consultation.pk}/",
+            *(f"/api/sync/{feed}/" for feed in FEEDS),
+            "/api/audit/consultation/",
+            f"/api/audit/consultation/{consultation.pk}/",
+        ):
+            with self.subTest(path=path):
+                self.assert_get_within_budget(path)
+
+    def test_public_endpoints_for_anonymous(self):
+        self.client.logout()
+        self.assert_get_within_budget("/api/doctors/")
+        self.assert_get_within_budget(f"/api/doctors/{self.doctor.pk}/")
+
+    def test_nested_clinic_doctors(self):
+        # ClinicSerializer.doctors: врачи всех клиник одним запросом
+        with query_budget_context(2):
+            data = ClinicSerializer(
+                Clinic.objects.prefetch_related("doctors"), many=True
+            ).data
+        self.assertEqual(sorted(len(clinic["doctors"]) for clinic in data), [2, 3])
+
+    def test_consultation_create(self):
+        response = self.post("/api/consultations/", self.booking(5))
+        self.assertEqual(response.status_code, 201)
+        assert_within_query_budget(response)
+
+    def test_consultation_update(self):
+        consultation = Consultation.objects.first()
+        response = self.patch(
+            f"/api/consultations/{consultation.pk}/", {"status": "started"}
+        )
+        self.assertEqual(response.status_code, 200)
+        assert_within_query_budget(response)
+        self.assertTrue(
+            AuditEntry.objects.filter(
+                entity_id=consultation.pk, action=AuditEntry.Action.UPDATE
+            ).exists()
+        )
@@ -0,0 +1,26 @@
+from django.urls import path
+
+from main import views
+
+urlpatterns = [
+    path("doctors/", views.doctor_list, name="doctor-list"),
+    path("doctors/<uuid:pk>/", views.doctor_profile, name="doctor-profile"),
+    path("patients/search/", views.patient_search, name="patient-search"),
+    path("consultations/", views.consultation_list, name="consultation-list"),
+    path(
+        "consultations/<uuid:pk>/",
+        views.consultation_detail,
+        name="consultation-detail",
+    ),
+    path("batch/", views.batch, name="batch"),
+    path("schedule/stream/", views.schedule_stream, name="schedule-stream"),
+    path("sync/<str:feed>/", views.sync_feed, name="sync-feed"),
+    path("audit/<str:entity_type>/", views.audit_history, name="audit-history"),
+    path(
+        "audit/<str:entity_type>/<uuid:entity_id>/",
+        views.audit_history,
+        name="audit-entity-history",
+    ),
+    path("status/pool/", views.pool_status, name="pool-status"),
+    path("metrics/", views.metrics, name="metrics"),
+]
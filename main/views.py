@@ -1,3 +1,281 @@
-from django.shortcuts import render
+import asyncio
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.db.models import Q
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
+from rest_framework import status
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from django.shortcuts import get_object_or_404
+from django.utils.crypto import constant_time_compare
+
+from main.instrumentation import (
+    database_pool_stats,
+    query_budget,
+    registry,
+    render_pool_prometheus,
+    serializer_timer,
+)
+from main.audit import history
+from main.batch import execute
+from main.broadcast import broadcaster
+from main.idempotency import idempotent
+from main.jobs import render_jobs_prometheus
+from main.models import Consultation, DoctorProfile
+from main.search import search_patients
+from main.sync import FEEDS, changes_since
+from main.serializers.audit_serializer import AuditEntrySerializer
+from main.serializers.batch_serializer import BatchSerializer
+from main.serializers.consult_serializer import (
+    ConsultationReadSerializer,
+    ConsultationWriteSerializer,
+)
+from main.serializers.patient_serializer import PatientSerializer
+from main.serializers.query_serializer import (
+    AuditHistoryQuerySerializer,
+    ConsultationListQuerySerializer,
+    DoctorListQuerySerializer,
+    SyncQuerySerializer,
+    encode_cursor,
+)
+from main.profiles import render_doctor_profile
+
+
+# В бюджеты закрытых view входят два запроса SessionAuthentication
+# (сессия и пользователь); публичные профили врачей аутентификацию
+# пропускают, иначе DRF загрузил бы пользователя и для них
+@query_budget(1)
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def doctor_list(request):
+    # keyset-пагинация по doctor_id (UUIDv7 — порядок создания): страница
+    # читается по первичному ключу без OFFSET
+    params = DoctorListQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    limit = params.validated_data["limit"]
+    queryset = DoctorProfile.objects.filter(is_deleted=False)
+    if "after" in params.validated_data:
+        queryset = queryset.filter(doctor_id__gt=params.validated_data["after"])
+    rows = list(
+        queryset.order_by("doctor_id").values_list("doctor_id", "document")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    with serializer_timer():
+        data = [render_doctor_profile(document) for _, document in rows]
+    return Response({"results": data, "next": rows[-1][0] if has_more else None})
+
+
+@query_budget(1)
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def doctor_profile(request, pk):
+    profile = get_object_or_404(
+        DoctorProfile.objects.only("document"), doctor_id=pk, is_deleted=False
+    )
+    with serializer_timer():
+        data = render_doctor_profile(profile.document)
+    return Response(data)
+
+
+@query_budget(3)
+@api_view(["GET"])
+def patient_search(request):
+    patients = search_patients(request.query_params.get("q", ""))
+    with serializer_timer():
+        data = PatientSerializer(patients, many=True).data
+    return Response(data)
+
+
+@query_budget(4, POST=16)
+@api_view(["GET", "POST"])
+@idempotent
+def consultation_list(request):
+    if request.method == "POST":
+        serializer = ConsultationWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        consultation = serializer.save()
+        with serializer_timer():
+            data = ConsultationReadSerializer(consultation).data
+        return Response(data, status=status.HTTP_201_CREATED)
+    # keyset-пагинация по (start_time, id), как в doctor_list
+    params = ConsultationListQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    filters = dict(params.validated_data)
+    limit = filters.pop("limit")
+    after = filters.pop("after", None)
+    queryset = Consultation.objects.filter(**filters)
+    if after is not None:
+        start_time, pk = after
+        queryset = queryset.filter(
+            Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=pk)
+        )
+    rows = list(
+        ConsultationReadSerializer.setup_eager_loading(
+            queryset.order_by("start_time", "id")
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    with serializer_timer():
+        data = ConsultationReadSerializer(rows, many=True).data
+    return Response(
+        {
+            "results": data,
+            "next": (
+                encode_cursor(rows[-1].start_time, rows[-1].id) if has_more else None
+            ),
+        }
+    )
+
+
+@query_budget(4, PATCH=10)
+@api_view(["GET", "PATCH"])
+def consultation_detail(request, pk):
+    if request.method == "PATCH":
+        consultation = get_object_or_404(Consultation.objects, pk=pk)
+        context = {}
+        if_match = request.headers.get("If-Match", "").strip('W/"')
+        if if_match.isdigit():
+            context["expected_version"] = int(if_match)
+        serializer = ConsultationWriteSerializer(
+            consultation, data=request.data, partial=True, context=context
+        )
+        serializer.is_valid(raise_exception=True)
+        consultation = serializer.save()
+    else:
+        consultation = get_object_or_404(
+            ConsultationReadSerializer.setup_eager_loading(Consultation.objects),
+            pk=pk,
+        )
+    with serializer_timer():
+        data = ConsultationReadSerializer(consultation).data
+    response = Response(data)
+    response["ETag"] = f'"{consultation.version}"'
+    return response
+
+
+@api_view(["POST"])
+@idempotent
+def batch(request):
+    # Несколько операций за один запрос: проверки однотипных операций
+    # выполняются общими запросами, запись идёт в одной транзакции
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    results = execute(
+        serializer.validated_data["operations"], serializer.validated_data["atomic"]
+    )
+    failed = any(result["status"] >= 400 for result in results)
+    return Response(
+        {"results": results},
+        status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK,
+    )
+
+
+@query_budget(4)
+@api_view(["GET"])
+def sync_feed(request, feed):
+    if feed not in FEEDS:
+        raise Http404
+    params = SyncQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return Response(
+        changes_since(
+            feed, params.validated_data.get("since"), params.validated_data["limit"]
+        )
+    )
+
+
+async def schedule_stream(request):
+    # Server-Sent Events; держит соединение открытым, поэтому обслуживается
+    # только ASGI-приложением (asgi.py). Обычный Django-view, поэтому
+    # DEFAULT_PERMISSION_CLASSES сюда не доходит и вход проверяется вручную
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    channels = [
+        f"{kind}:{value}"
+        for kind in ("doctor", "clinic", "day")
+        for value in request.GET.getlist(kind)
+    ]
+    if not channels:
+        return HttpResponseBadRequest("Укажите doctor, clinic или day")
+
+    async def events():
+        async with broadcaster.subscribe(channels) as subscription:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), settings.SCHEDULE_STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield (
+                    f"event: {event['type']}\n"
+                    f"id: {event['id']}:{event['version']}\n"
+                    f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                )
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@query_budget(3)
+@api_view(["GET"])
+def audit_history(request, entity_type, entity_id=None):
+    if entity_type not in ("consultation", "patient"):
+        raise Http404
+    params = AuditHistoryQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    entries = history(
+        entity_type,
+        entity_id,
+        params.validated_data.get("start"),
+        params.validated_data.get("end"),
+    )[: params.validated_data["limit"]]
+    with serializer_timer():
+        data = AuditEntrySerializer(entries, many=True).data
+    return Response(data)
+
+
+def _metrics_allowed(request) -> bool:
+    # Prometheus приходит с токеном, человек — со staff-сессией
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if token and constant_time_compare(authorization, f"Bearer {token}"):
+        return True
+    return request.user.is_staff
+
+
+def metrics(request):
+    # трафик по view, пулы соединений и очередь задач наружу не отдаются
+    if not _metrics_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(
+        registry.render_prometheus()
+        + render_pool_prometheus()
+        + render_jobs_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@api_view(["GET"])
+def pool_status(request):
+    return Response(database_pool_stats())
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import threading
+import time
+from importlib import import_module
+from typing import Any, Callable
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.urls import get_resolver, reverse
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+# Модуль импортируется и до django.setup() (дочерний процесс profile_startup),
+# поэтому модели, сериализаторы и DRF подгружаются внутри функций
+
+
+def _walk_fields(serializer) -> None:
+    # поля ModelSerializer строятся лениво при первом обращении к .fields,
+    # вместе с ними заполняются кэши _meta моделей всего дерева
+    for field in serializer.fields.values():
+        child = getattr(field, "child", field)
+        if hasattr(child, "fields"):
+            _walk_fields(child)
+
+
+def warm_urls() -> None:
+    resolver = get_resolver()
+    for name in ("consultation-list", "doctor-list", "batch"):
+        resolver.resolve(reverse(name))
+
+
+def warm_serializers() -> None:
+    from main.serializers.batch_serializer import BatchSerializer
+    from main.serializers.clinic_serializer import ClinicSerializer
+    from main.serializers.consult_serializer import (
+        ConsultationReadSerializer,
+        ConsultationSyncSerializer,
+        ConsultationWriteSerializer,
+    )
+    from main.serializers.doctor_serializer import DoctorSerializer
+    from main.serializers.patient_serializer import PatientSerializer
+
+    for serializer_class in (
+        ConsultationReadSerializer,
+        ConsultationWriteSerializer,
+        ConsultationSyncSerializer,
+        PatientSerializer,
+        DoctorSerializer,
+        ClinicSerializer,
+        BatchSerializer,
+    ):
+        _walk_fields(serializer_class())
+    # валидаторы Django компилируют свои регулярные выражения при первом вызове
+    PatientSerializer().fields["email"].run_validation("warmup@example.com")
+
+
+def warm_translations() -> None:
+    from rest_framework.fields import Field
+
+    with translation.override(settings.LANGUAGE_CODE):
+        str(Field.default_error_messages["required"])
+
+
+def warm_database() -> None:
+    for alias in settings.DATABASES:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning("Прогрев: база %s недоступна", alias, exc_info=True)
+        finally:
+            # соединение привязано к потоку прогрева; с пулом close()
+            # возвращает его в уже открытый пул
+            connections[alias].close()
+
+
+def _client():
+    from django.test import Client
+
+    host = next(
+        (host for host in settings.ALLOWED_HOSTS if host != "*" and host[0] != "."),
+        "localhost",
+    )
+    return Client(HTTP_HOST=host)
+
+
+def warm_requests() -> None:
+    # Остальное ленивое (регулярки HttpRequest/HttpResponse, подписи сессий,
+    # компилятор SQL) проще всего прогреть настоящим запросом через все
+    # middleware; в метрики view он не попадает
+    from main.instrumentation import not_recorded
+
+    client = _client()
+    with not_recorded():
+        for path in settings.WARMUP_PATHS:
+            response = client.get(path)
+            if response.status_code >= 400:
+                logger.warning(
+                    "Прогрев: %s ответил HTTP %s", path, response.status_code
+                )
+
+
+STEPS: dict[str, Callable[[], None]] = {
+    "urls": warm_urls,
+    "serializers": warm_serializers,
+    "translations": warm_translations,
+    "database": warm_database,
+    "requests": warm_requests,
+}
+
+
+def warm_up(database: bool = True) -> dict[str, float]:
+    # Ошибка прогрева не должна мешать воркеру стартовать: первый запрос
+    # просто выполнит отложенную работу сам
+    timings = {}
+    for name, step in STEPS.items():
+        if name in ("database", "requests") and not database:
+            continue
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Прогрев: шаг %s завершился ошибкой", name)
+        timings[name] = time.perf_counter() - start
+    total = sum(timings.values())
+    if total > settings.WARMUP_MAX_SECONDS:
+        logger.warning(
+            "Прогрев занял %.2f с (лимит %s с): %s",
+            total,
+            settings.WARMUP_MAX_SECONDS,
+            timings,
+        )
+    else:
+        logger.info("Прогрев занял %.3f с: %s", total, timings)
+    return timings
+
+
+def on_startup() -> None:
+    if not settings.WARMUP_ON_STARTUP:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        warm_up(database=settings.WARMUP_DATABASE)
+        return
+    # uvicorn импортирует asgi.py внутри работающего цикла событий, где ORM
+    # и тестовый клиент падают с SynchronousOnlyOperation: прогрев идёт
+    # в отдельном потоке, трафик до его окончания всё равно не принимается
+    thread = threading.Thread(
+        target=warm_up,
+        kwargs={"database": settings.WARMUP_DATABASE},
+        name="warmup",
+    )
+    thread.start()
+    thread.join()
+
+
+def measure_startup(
+    paths: list[str], warmup: bool = True, username: str | None = None
+) -> dict[str, Any]:
+    # Выполняется в свежем процессе: все ленивые шаги ещё не сделаны
+    import django
+
+    stages = {}
+    start = time.perf_counter()
+    django.setup()
+    stages["django_setup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import_module(settings.ROOT_URLCONF)
+    stages["import_urlconf"] = time.perf_counter() - start
+
+    from django.core.wsgi import get_wsgi_application
+    from django.test.utils import CaptureQueriesContext
+
+    start = time.perf_counter()
+    get_wsgi_application()
+    stages["load_middleware"] = time.perf_counter() - start
+
+    warm_up_timings = warm_up(database=settings.WARMUP_DATABASE) if warmup else {}
+
+    client = _client()
+    if username:
+        from django.contrib.auth import get_user_model
+
+        # сессия создаётся до замеров; её чтение остаётся в первом запросе
+        client.force_login(get_user_model().objects.get(username=username))
+    requests = []
+    for path in paths:
+        for attempt in ("first", "second"):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(path)
+                elapsed = time.perf_counter() - start
+            requests.append(
+                {
+                    "path": path,
+                    "attempt": attempt,
+                    "status": response.status_code,
+                    "seconds": elapsed,
+                    "queries": len(queries.captured_queries),
+                }
+            )
+    return {"stages": stages, "warm_up": warm_up_timings, "requests": requests}
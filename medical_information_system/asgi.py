@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_information_system.settings')
 
 application = get_asgi_application()
+
+# до приёма трафика: URL-резолвер, поля сериализаторов, первое соединение к базе
+from main.warmup import on_startup  # noqa: E402
+
+on_startup()
@@ -46,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.InstrumentationMiddleware',
+    'main.db_router.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.audit.AuditContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,12 +89,48 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD"),
         'HOST': os.getenv("DB_HOST"),
         'PORT': os.getenv("DB_PORT"),
-    },
-    "OPTIONS": {
-        "pool": True,
+        # Пул psycopg3 требует CONN_MAX_AGE = 0: соединения живут в пуле
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true",
+        'OPTIONS': {},
     },
 }
 
+if os.getenv("DB_POOL", "true").lower() == "true":
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        'timeout': float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        'max_idle': float(os.getenv("DB_POOL_MAX_IDLE", "600")),
+        'max_lifetime': float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+    }
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2
+for index, replica in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(","))):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+
+# Допустимое отставание реплики (сек) и как часто его проверять
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "2"))
+# Сколько секунд после записи клиент читает из primary
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "10"))
+
+# Локальные бенчмарки и разработка без PostgreSQL: DB_ENGINE=sqlite
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv("DB_NAME") or BASE_DIR / 'db.sqlite3',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,3 +172,54 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Сколько секунд хранится ответ для повторов с тем же Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+
+# Доставка событий расписания в SSE-подписки. LocalBackend работает в пределах
+# одного процесса; при нескольких воркерах нужен PostgresNotifyBackend
+SCHEDULE_BROADCAST_BACKEND = os.getenv(
+    "SCHEDULE_BROADCAST_BACKEND", "main.broadcast.LocalBackend"
+)
+SCHEDULE_STREAM_KEEPALIVE = int(os.getenv("SCHEDULE_STREAM_KEEPALIVE", "15"))
+
+# Фоновые задачи (main.jobs). JOBS_RUN_INLINE=true выполняет их сразу после
+# коммита без воркера — для разработки
+JOBS_RUN_INLINE = os.getenv("JOBS_RUN_INLINE", "false").lower() == "true"
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "5"))
+JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", "3600"))
+JOBS_VISIBILITY_TIMEOUT = float(os.getenv("JOBS_VISIBILITY_TIMEOUT", "300"))
+# Выполненные задачи старше JOBS_DONE_RETENTION удаляют воркеры раз в
+# JOBS_PURGE_INTERVAL секунд
+JOBS_DONE_RETENTION = float(os.getenv("JOBS_DONE_RETENTION", str(24 * 60 * 60)))
+JOBS_PURGE_INTERVAL = float(os.getenv("JOBS_PURGE_INTERVAL", "600"))
+
+# Журнал аудита (main.audit). commit — записи пишутся сразу после коммита
+# транзакции; buffered — копятся в памяти и сбрасываются пачками в фоне
+# (быстрее, но при падении процесса последние записи теряются)
+AUDIT_DURABILITY = os.getenv("AUDIT_DURABILITY", "commit")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+AUDIT_COPY_THRESHOLD = int(os.getenv("AUDIT_COPY_THRESHOLD", "50"))
+
+# /api/metrics/ отдаётся staff-пользователям и по заголовку
+# Authorization: Bearer <METRICS_TOKEN> (bearer_token в конфиге Prometheus)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# API закрыто по умолчанию; публичны только профили врачей (main.views)
+REST_FRAMEWORK = {
+    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
+}
+
+# Максимальное число операций в одном запросе /api/batch/
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "500"))
+
+# Прогрев воркера в wsgi.py/asgi.py (main.warmup) до приёма трафика.
+# С gunicorn --preload прогрев выполняется в мастере до fork, и открытые
+# соединения пула не переживут fork: тогда WARMUP_DATABASE=false
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_DATABASE = os.getenv("WARMUP_DATABASE", "true").lower() == "true"
+WARMUP_MAX_SECONDS = float(os.getenv("WARMUP_MAX_SECONDS", "5"))
+# GET-запросы прогрева (без входа, поэтому только публичные URL);
+# выполняются, только если включён WARMUP_DATABASE
+WARMUP_PATHS = os.getenv("WARMUP_PATHS", "/api/doctors/").split(",")
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_information_system.settings')
 
 application = get_wsgi_application()
+
+# до приёма трафика: URL-резолвер, поля сериализаторов, первое соединение к базе
+from main.warmup import on_startup  # noqa: E402
+
+on_startup()